@@ -1,10 +1,15 @@
 from .nodes import NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS
 from .logger import logger
 from .init import install_js
+from .hash_index import hash_index, PRECOMPUTE_ENABLED
+from . import routes
 
 nodesstr = "\n".join(NODE_CLASS_MAPPINGS.keys())
 logger.info(f"Loading D00MYs nodes: {nodesstr}")
 install_js()
+if PRECOMPUTE_ENABLED:
+    # Hash the models in the background so the first save with metadata does not wait
+    hash_index.start_precompute()
 
 WEB_DIRECTORY = "./web"
 __all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS", "WEB_DIRECTORY"]
@@ -0,0 +1,145 @@
+import io
+import os
+import tarfile
+import zipfile
+import threading
+from collections import OrderedDict
+
+from .logger import logger
+from .utils import is_image_path, split_patterns, match_patterns
+from .shards import MEMBER_SEPARATOR, SHARD_INDEX_EXT, member_ref, read_shard_index
+
+# Compressed tars have no random access, only plain .tar (and the shards) are read
+ARCHIVE_EXTENSIONS = [".zip", ".tar"]
+ARCHIVE_INDEXES_SIZE = 16
+
+
+def is_archive_path(path: str):
+    return os.path.splitext(path)[1].lower() in ARCHIVE_EXTENSIONS
+
+def split_archive_ref(path: str):
+    # (archive path, member name) of path/to/archive.zip#member, or (path, None) for a plain path
+    archive_path, separator, member_name = path.rpartition(MEMBER_SEPARATOR)
+    if separator and is_archive_path(archive_path):
+        return archive_path, member_name
+    return path, None
+
+def archive_ref(archive_path: str, member_name: str):
+    return member_ref(archive_path, member_name)
+
+
+"""
+Members of a .zip or .tar archive listed once: zips by their central directory, tars by the
+index written next to a shard or else by one pass over the headers. Members are then read
+directly, without going through the archive again
+"""
+class ArchiveIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self.__zip = None
+        self.__members = {}
+        self.__directories = None
+        self.__lock = threading.Lock()
+        if path.lower().endswith(".zip"):
+            self.__zip = zipfile.ZipFile(path)
+            self.__members = {info.filename: info for info in self.__zip.infolist() if not info.is_dir()}
+        else:
+            self.__members = self.__read_shard_index() or self.__scan_tar()
+        self.names = sorted(self.__members)
+
+    def __contains__(self, member_name: str):
+        return member_name in self.__members
+
+    def listing(self, directory: str):
+        # Names of the members directly in directory ("" for the root of the archive)
+        with self.__lock:
+            if self.__directories is None:
+                self.__directories = {}
+                for name in self.names:
+                    member_dir, _, member_name = name.rpartition("/")
+                    self.__directories.setdefault(member_dir, set()).add(member_name)
+        return self.__directories.get(directory, set())
+
+    def read(self, member_name: str):
+        if self.__zip is not None:
+            # ZipFile reads of several threads are serialized on its file
+            return self.__zip.read(member_name)
+        offset, size = self.__members[member_name]
+        with open(self.path, "rb") as fp:
+            fp.seek(offset)
+            return fp.read(size)
+
+    # Private API
+    def __read_shard_index(self):
+        # Only when written after the last sample, a shard can be cut short by a crash
+        try:
+            if os.path.getmtime(f"{self.path}{SHARD_INDEX_EXT}") < os.path.getmtime(self.path):
+                return None
+        except OSError:
+            return None
+        return read_shard_index(self.path)
+
+    def __scan_tar(self):
+        members = {}
+        with tarfile.open(self.path, "r:") as tar:
+            for info in tar:
+                if info.isfile():
+                    members[info.name] = (info.offset_data, info.size)
+        return members
+
+
+# Indexes by archive path, mtime and size
+archive_indexes = OrderedDict()
+archive_indexes_lock = threading.Lock()
+
+def get_archive_index(path: str):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with archive_indexes_lock:
+        index = archive_indexes.get(key)
+        if index is not None:
+            archive_indexes.move_to_end(key)
+            return index
+    index = ArchiveIndex(path)
+    with archive_indexes_lock:
+        archive_indexes[key] = index
+        while len(archive_indexes) > ARCHIVE_INDEXES_SIZE:
+            archive_indexes.popitem(last=False)
+    return index
+
+def iter_archive_images(path: str, include: str = "", exclude: str = ""):
+    # Every image of the archive by member name, patterns match the member path
+    include = split_patterns(include)
+    exclude = split_patterns(exclude)
+    try:
+        index = get_archive_index(path)
+    except Exception as e:
+        logger.error(f"Cannot list images in archive {path}: {e}")
+        return
+    for name in index.names:
+        if not is_image_path(name):
+            continue
+        if include and not match_patterns(name, include):
+            continue
+        if exclude and match_patterns(name, exclude):
+            continue
+        yield archive_ref(path, name)
+
+def is_archive_member(path: str):
+    archive_path, member_name = split_archive_ref(path)
+    try:
+        return member_name is not None and member_name in get_archive_index(archive_path)
+    except Exception as e:
+        logger.error(f"Cannot read archive {archive_path}: {e}")
+        return False
+
+def read_archive_member(path: str):
+    archive_path, member_name = split_archive_ref(path)
+    return get_archive_index(archive_path).read(member_name)
+
+def image_source(path: str):
+    # What Image.open takes for a file or an archive member
+    archive_path, member_name = split_archive_ref(path)
+    if member_name is None:
+        return path
+    return io.BytesIO(get_archive_index(archive_path).read(member_name))
@@ -0,0 +1,73 @@
+"""
+pil2tensor / tensor2pil against the previous astype/float implementation.
+Peak is the numpy memory traced by tracemalloc on top of the result.
+
+    python benchmarks/bench_conversions.py --sizes 512 1024 4096
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+import numpy
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from comfy_stubs import import_nodes
+
+
+def legacy_pil2tensor(image):
+    np_image = numpy.array(image).astype(numpy.float32) / 255.0
+    if np_image.ndim == 2:
+        np_image = numpy.array(image.convert("RGB")).astype(numpy.float32) / 255.0
+    return torch.from_numpy(np_image[None, ...])
+
+def legacy_tensor2pil(tensor):
+    array = numpy.array((tensor * 255).numpy(), dtype=numpy.uint8)
+    return Image.fromarray(array[0])
+
+def measure(func, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    result = func(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 4096])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    nodes, _ = import_nodes()
+    utils = sys.modules[nodes.__package__ + ".utils"]
+    print(f"{'size':>6} {'function':<12} {'mode':<4} {'legacy ms':>10} {'new ms':>8} {'legacy peak MB':>15} {'new peak MB':>12}")
+    for size in args.sizes:
+        rng = numpy.random.default_rng(size)
+        for mode in ("RGB", "L"):
+            channels = (size, size, 3) if mode == "RGB" else (size, size)
+            image = Image.fromarray(rng.integers(0, 256, channels, dtype=numpy.uint8), mode)
+            tensor = utils.pil2tensor(image)
+            rows = [
+                ("pil2tensor", image, legacy_pil2tensor, utils.pil2tensor),
+                ("tensor2pil", tensor, legacy_tensor2pil, utils.tensor2pil),
+            ]
+            for name, arg, legacy, new in rows:
+                if name == "tensor2pil" and mode == "L":
+                    continue
+                legacy_time, legacy_peak = measure(legacy, arg, args.repeat)
+                new_time, new_peak = measure(new, arg, args.repeat)
+                print(f"{size:>6} {name:<12} {mode:<4} {legacy_time*1000:>10.1f} {new_time*1000:>8.1f} {legacy_peak/2**20:>15.1f} {new_peak/2**20:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Images/sec of the Load_Images_From_Paths decode pool against the thread count.
+
+    python benchmarks/bench_decode_threads.py --count 64 --size 1024 --threads 1 2 4 8
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from comfy_stubs import import_nodes
+from synthetic import make_images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=64)
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--file-type", default="JPEG", choices=["JPEG", "PNG", "WebP"])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    nodes, _ = import_nodes()
+    with tempfile.TemporaryDirectory(prefix="d00mys_bench_") as directory:
+        images_paths = make_images(directory, args.count, args.size, args.file_type)
+        print(f"{args.count} x {args.size}px {args.file_type}")
+        print(f"{'threads':>8} {'images/sec':>12}")
+        for threads in args.threads:
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                images = nodes.load_images(images_paths, threads)
+                best = min(best, time.perf_counter() - start)
+                del images
+            print(f"{threads:>8} {args.count / best:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Saving with EXIF metadata: embedded while encoding against the previous
+save then piexif.insert rewrite. I/O is read from /proc/self/io (Linux).
+
+    python benchmarks/bench_exif.py --count 100 --size 1024
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy
+import piexif
+import piexif.helper
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from comfy_stubs import import_nodes
+
+
+def io_counters():
+    try:
+        with open("/proc/self/io") as fp:
+            counters = dict(line.split(": ") for line in fp.read().splitlines())
+        return int(counters["rchar"]), int(counters["wchar"])
+    except OSError:
+        return 0, 0
+
+def run(save, images, directory, file_type, exif_bytes):
+    read_start, write_start = io_counters()
+    start = time.perf_counter()
+    for index, image in enumerate(images):
+        save(os.path.join(directory, f"image_{index:05}"), file_type, image, exif_bytes)
+    elapsed = time.perf_counter() - start
+    read_end, write_end = io_counters()
+    return elapsed, read_end - read_start, write_end - write_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--file-types", nargs="+", default=["JPEG", "WebP"])
+    args = parser.parse_args()
+
+    nodes, _ = import_nodes()
+    rng = numpy.random.default_rng(0)
+    gradient = numpy.linspace(0, 255, args.size, dtype=numpy.uint8)
+    images = list()
+    for index in range(args.count):
+        pixels = numpy.stack([numpy.tile(gradient, (args.size, 1)), numpy.tile(gradient[:, None], (1, args.size)), 
+                              rng.integers(0, 256, (args.size, args.size), dtype=numpy.uint8)], axis=-1)
+        images.append(Image.fromarray(pixels))
+    exif_bytes = piexif.dump({"Exif": {piexif.ExifIFD.UserComment: piexif.helper.UserComment.dump("positive prompt\nSteps: 20, Seed: 1" * 20, encoding="unicode")}})
+
+    def legacy_save(path, file_type, image, exif_bytes):
+        nodes.save_image(path, file_type, image)
+        piexif.insert(exif_bytes, path)
+
+    def single_pass_save(path, file_type, image, exif_bytes):
+        nodes.save_image(path, file_type, image, exif_bytes=exif_bytes)
+
+    print(f"{args.count} x {args.size}px")
+    print(f"{'type':<6} {'mode':<12} {'seconds':>8} {'read MB':>8} {'written MB':>11}")
+    for file_type in args.file_types:
+        for name, save in (("save+insert", legacy_save), ("single pass", single_pass_save)):
+            with tempfile.TemporaryDirectory(prefix="d00mys_bench_") as directory:
+                elapsed, read, written = run(save, images, directory, file_type, exif_bytes)
+            print(f"{file_type:<6} {name:<12} {elapsed:>8.2f} {read/2**20:>8.1f} {written/2**20:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Import time of the node pack measured with python -X importtime in a fresh interpreter,
+alone and with the modules ComfyUI has already imported when it loads custom nodes.
+
+    python benchmarks/bench_import_time.py --repeat 5 --top 10
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+from comfy_stubs import PACKAGE_NAME
+
+# Imported by ComfyUI itself before the custom nodes
+COMFY_PRELOADED = ["torch", "numpy", "PIL.Image", "aiohttp"]
+MODULES = ["nodes", "init", "hash_index"]
+
+
+def measure(preload: list):
+    code = "\n".join([
+        "import sys",
+        f"sys.path.insert(0, {BENCHMARKS_DIR!r})",
+        *[f"import {name}" for name in preload],
+        "from comfy_stubs import install_stubs, PACKAGE_NAME, PACKAGE_DIR",
+        "import types",
+        "install_stubs()",
+        "package = types.ModuleType(PACKAGE_NAME)",
+        "package.__path__ = [PACKAGE_DIR]",
+        "sys.modules[PACKAGE_NAME] = package",
+        "print('--- node pack ---', file=sys.stderr)",
+        *[f"import {PACKAGE_NAME}.{name}" for name in MODULES],
+    ])
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    lines = result.stderr.split("--- node pack ---", 1)[1].splitlines()
+    # import time: self [us] | cumulative | imported package
+    modules = []
+    for line in lines:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((int(self_us), int(cumulative_us), name.rstrip()))
+    total = sum(self_us for self_us, _, _ in modules)
+    return total, modules
+
+
+def report(title: str, preload: list, repeat: int, top: int):
+    runs = [measure(preload) for _ in range(repeat)]
+    totals = [total for total, _ in runs]
+    print(f"{title}: median {statistics.median(totals) / 1000:.1f}ms, min {min(totals) / 1000:.1f}ms over {repeat} runs")
+    _, modules = min(runs, key=lambda run: run[0])
+    for self_us, cumulative_us, name in sorted(modules, key=lambda module: module[0], reverse=True)[:top]:
+        print(f"    {self_us / 1000:8.1f}ms self {cumulative_us / 1000:8.1f}ms cumulative  {name.strip()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list")
+    args = parser.parse_args()
+
+    report("Node pack alone", [], args.repeat, args.top)
+    preload = [name for name in COMFY_PRELOADED if subprocess.run([sys.executable, "-c", f"import {name}"], capture_output=True).returncode == 0]
+    report(f"After {', '.join(preload)}", preload, args.repeat, args.top)
+
+
+if __name__ == "__main__":
+    main()
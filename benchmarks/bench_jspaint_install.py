@@ -0,0 +1,55 @@
+"""
+Startup cost of installing the bundled JSPaint into ComfyUI/web/jspaint, the
+previous full copytree on every start against the versioned install.
+
+    python benchmarks/bench_jspaint_install.py --repeat 3
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import importlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from comfy_stubs import import_nodes
+
+
+def timed(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    nodes, comfy_dir = import_nodes()
+    init = importlib.import_module(f"{nodes.__package__}.init")
+    source_dir = init.get_ext_dir("jspaint")
+    target_dir = init.get_comfy_dir("web/jspaint")
+
+    def legacy():
+        shutil.copytree(source_dir, target_dir, dirs_exist_ok=True)
+
+    def cold():
+        shutil.rmtree(target_dir, ignore_errors=True)
+        init.copy_jspaint(source_dir, target_dir)
+
+    def warm():
+        init.copy_jspaint(source_dir, target_dir)
+
+    print(f"{len(init.jspaint_manifest(source_dir))} files in {source_dir}")
+    print(f"copytree every start   : {timed(legacy, args.repeat):.3f}s")
+    print(f"versioned, first start : {timed(cold, args.repeat):.3f}s")
+    print(f"versioned, next starts : {timed(warm, args.repeat):.3f}s")
+    shutil.rmtree(comfy_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
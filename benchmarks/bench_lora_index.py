@@ -0,0 +1,73 @@
+"""
+LoRA and embedding path resolution of the metadata extractor on a synthetic
+model library, indexed lookups against the previous linear scans.
+
+    python benchmarks/bench_lora_index.py --files 5000 --prompts 64
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from comfy_stubs import import_nodes
+
+
+def legacy_lora_path_for(folder_paths, lora):
+    extension = lora[lora.rfind('.'):] if lora.rfind('.') != -1 else ""
+    if extension not in folder_paths.supported_pt_extensions:
+        lora += ".safetensors"
+    matching_lora = next((x for x in folder_paths.get_filename_list("loras") if x.endswith(lora)), None)
+    return folder_paths.get_full_path("loras", matching_lora) if matching_lora else None
+
+def legacy_embedding_path_for(folder_paths, embedding):
+    matching_embedding = next((x for x in folder_paths.get_filename_list("embeddings") if x.startswith(embedding)), None)
+    return folder_paths.get_full_path("embeddings", matching_embedding) if matching_embedding else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--prompts", type=int, default=64)
+    parser.add_argument("--tags", type=int, default=8, help="LoRA and embedding tags per prompt")
+    args = parser.parse_args()
+
+    nodes, _ = import_nodes()
+    folder_paths = sys.modules["folder_paths"]
+    extractor = sys.modules[nodes.__package__ + ".metadata_extractor"]
+    rng = random.Random(0)
+    loras = [f"{'style' if i % 3 else 'characters/sub'}/lora_{i:05}.safetensors" for i in range(args.files)]
+    embeddings = [f"embedding_{i:05}.pt" for i in range(args.files)]
+    # Like ComfyUI, every call returns a new copy of the cached list
+    folder_paths.get_filename_list = lambda folder_name: list({"loras": loras, "embeddings": embeddings}.get(folder_name, []))
+    prompts = list()
+    for _ in range(args.prompts):
+        tags = [f"<lora:lora_{rng.randrange(args.files):05}:0.8>" for _ in range(args.tags)]
+        tags += [f"embedding:embedding_{rng.randrange(args.files):05}" for _ in range(args.tags)]
+        prompts.append("a photo, " + ", ".join(tags))
+    Extractor = extractor.PromptMetadataExtractor
+
+    def resolve(lora_path_for, embedding_path_for):
+        found = 0
+        for prompt in prompts:
+            for lora in Extractor.LORA.findall(prompt):
+                found += lora_path_for(lora) is not None
+            for embedding in Extractor.EMBEDDING.findall(prompt):
+                found += embedding_path_for(embedding) is not None
+        return found
+
+    rows = (
+        ("linear scan", lambda lora: legacy_lora_path_for(folder_paths, lora), lambda embedding: legacy_embedding_path_for(folder_paths, embedding)),
+        ("index", extractor.full_lora_path_for, extractor.full_embedding_path_for),
+    )
+    print(f"{args.files} loras + {args.files} embeddings, {args.prompts} prompts x {args.tags * 2} tags")
+    print(f"{'lookup':<12} {'seconds':>8} {'found':>6}")
+    for name, lora_path_for, embedding_path_for in rows:
+        start = time.perf_counter()
+        found = resolve(lora_path_for, embedding_path_for)
+        print(f"{name:<12} {time.perf_counter() - start:>8.3f} {found:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Minimal stand-ins for the ComfyUI modules used by the nodes (folder_paths,
+comfy.utils and server) so this node pack can be imported and measured
+without a ComfyUI install.
+"""
+import os
+import sys
+import types
+import tempfile
+import importlib
+
+PACKAGE_NAME = "d00mys_nodes"
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ProgressBar:
+    def __init__(self, total):
+        self.total = total
+        self.current = 0
+
+    def update_absolute(self, value, total=None, preview=None):
+        self.current = value
+        if total is not None:
+            self.total = total
+
+
+def install_stubs(comfy_dir: str = None):
+    comfy_dir = comfy_dir or tempfile.mkdtemp(prefix="d00mys_comfy_")
+    for subdir in ("output", "temp", "input", "models/checkpoints", "models/loras", "models/embeddings"):
+        os.makedirs(os.path.join(comfy_dir, subdir), exist_ok=True)
+
+    folder_paths = types.ModuleType("folder_paths")
+    folder_paths.supported_pt_extensions = {".ckpt", ".pt", ".bin", ".pth", ".safetensors"}
+    folder_paths.filename_lists = {"checkpoints": [], "loras": [], "embeddings": []}
+    folder_paths.get_filename_list = lambda folder_name: folder_paths.filename_lists.get(folder_name, [])
+    folder_paths.get_folder_paths = lambda folder_name: [os.path.join(comfy_dir, "models", folder_name)]
+    folder_paths.get_full_path = lambda folder_name, filename: os.path.join(comfy_dir, "models", folder_name, filename)
+    folder_paths.get_output_directory = lambda: os.path.join(comfy_dir, "output")
+    folder_paths.get_temp_directory = lambda: os.path.join(comfy_dir, "temp")
+    folder_paths.get_input_directory = lambda: os.path.join(comfy_dir, "input")
+
+    def get_save_image_path(filename_prefix, output_dir, image_width=0, image_height=0):
+        subfolder = os.path.dirname(os.path.normpath(filename_prefix))
+        filename = os.path.basename(os.path.normpath(filename_prefix))
+        full_output_folder = os.path.join(output_dir, subfolder)
+        os.makedirs(full_output_folder, exist_ok=True)
+        return full_output_folder, filename, 1, subfolder, filename_prefix
+
+    folder_paths.get_save_image_path = get_save_image_path
+
+    comfy = types.ModuleType("comfy")
+    comfy_utils = types.ModuleType("comfy.utils")
+    comfy_utils.ProgressBar = ProgressBar
+    comfy.utils = comfy_utils
+
+    # get_comfy_dir() resolves the ComfyUI root from the file of PromptServer
+    server = types.ModuleType("server")
+    server.__file__ = os.path.join(comfy_dir, "server.py")
+    routes = types.SimpleNamespace(**{method: (lambda *args, **kwargs: (lambda handler: handler)) for method in ("get", "post", "put", "delete", "static")})
+    PromptServer = type("PromptServer", (), {"__module__": "server", "routes": routes})
+    PromptServer.instance = PromptServer()
+    server.PromptServer = PromptServer
+
+    sys.modules.update({
+        "folder_paths": folder_paths,
+        "comfy": comfy,
+        "comfy.utils": comfy_utils,
+        "server": server,
+    })
+    return comfy_dir
+
+
+def import_nodes(comfy_dir: str = None):
+    # Register the package without running its __init__ (JSPaint install, logging)
+    comfy_dir = install_stubs(comfy_dir)
+    if PACKAGE_NAME not in sys.modules:
+        package = types.ModuleType(PACKAGE_NAME)
+        package.__path__ = [PACKAGE_DIR]
+        sys.modules[PACKAGE_NAME] = package
+    nodes = importlib.import_module(f"{PACKAGE_NAME}.nodes")
+    return nodes, comfy_dir
@@ -0,0 +1,237 @@
+"""
+Offline benchmark suite of the node pack: ComfyUI is stubbed, images, captions and a model
+library are generated, and every case is timed on the CPU. Results are written as JSON so two
+versions can be compared with --baseline.
+
+    python benchmarks/run.py --output bench.json
+    python benchmarks/run.py --baseline bench.json --cases load save_metadata_jpeg
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import importlib
+import statistics
+import subprocess
+
+import PIL
+import numpy
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from comfy_stubs import import_nodes, PACKAGE_DIR
+from synthetic import make_images, make_model_library, make_prompt, make_png
+
+
+"""
+Everything the cases share: the imported nodes, the generated data and the arguments
+"""
+class Suite:
+    def __init__(self, args):
+        self.args = args
+        self.nodes, self.comfy_dir = import_nodes()
+        logging.getLogger("D00MYsNodes").setLevel(logging.WARNING)
+        self.folder_paths = sys.modules["folder_paths"]
+        package = self.nodes.__package__
+        # Keep the hashes of the fake models out of the cache folder of the extension
+        hash_index_module = importlib.import_module(f"{package}.hash_index")
+        self.new_hash_index = lambda: hash_index_module.HashIndex(os.path.join(self.comfy_dir, f"hashes_{time.perf_counter_ns()}.sqlite3"))
+        self.metadata_extractor = importlib.import_module(f"{package}.metadata_extractor")
+        self.metadata_extractor.hash_index = self.new_hash_index()
+        self.images_dir = os.path.join(self.comfy_dir, "input", "images")
+        self.images_paths = make_images(self.images_dir, args.count, args.size, args.file_type, captions=True)
+        self.library = make_model_library(self.comfy_dir, self.folder_paths, args.loras, args.embeddings, args.checkpoint_mb)
+        self.prompt = make_prompt(self.library)
+        self.png = make_png(args.size)
+        self.images = None
+        self.captions = None
+
+    def loaded(self):
+        if self.images is None:
+            self.images, self.captions = self.nodes.load_images_with_captions(self.images_paths, self.args.threads)
+        return self.images, self.captions
+
+
+def case_convert(suite):
+    output_directory = os.path.join(suite.comfy_dir, "output", "converted")
+    shutil.rmtree(output_directory, ignore_errors=True)
+    converted = suite.nodes.D00MYsImagesConverter().convert_images(suite.images_dir, output_directory, "PNG", workers=suite.args.workers)[2]
+    return converted
+
+def case_load(suite):
+    images, _, _ = suite.nodes.D00MYsLoadImagesFromPaths().load_images([suite.images_dir], [False], decode_threads=[suite.args.threads], cache=["none"])
+    return len(images)
+
+def case_load_batch(suite):
+    images, _, _ = suite.nodes.D00MYsLoadImagesFromPaths().load_images([suite.images_dir], [False], decode_threads=[suite.args.threads], cache=["none"],
+                                                                        output_mode=["batch"])
+    return sum(len(batch) for batch in images)
+
+def case_load_max_side(suite):
+    images, _, _ = suite.nodes.D00MYsLoadImagesFromPaths().load_images([suite.images_dir], [False], decode_threads=[suite.args.threads], cache=["none"],
+                                                                        max_side=[suite.args.max_side])
+    return len(images)
+
+def case_load_captions(suite):
+    images, captions, _ = suite.nodes.D00MYsLoadImagesFromPaths().load_images([suite.images_dir], [True], decode_threads=[suite.args.threads], cache=["none"])
+    assert len(images) == len(captions)
+    return len(images)
+
+def case_load_cached(suite):
+    node = suite.nodes.D00MYsLoadImagesFromPaths()
+    # The first call of the repeats fills the memory cache
+    images, _, _ = node.load_images([suite.images_dir], [False], decode_threads=[suite.args.threads], cache=["memory"])
+    return len(images)
+
+def save_images(suite, file_type):
+    images, captions = suite.loaded()
+    positive = suite.prompt["2"]["inputs"]["text"]
+    result = suite.nodes.D00MYsSaveImage().save_image(images, [f"bench/{file_type}"], [file_type], [True], [positive], ["blurry"],
+                                                      [suite.prompt], [{"workflow": suite.prompt}], save_workers=[suite.args.threads])
+    return len(result["result"][0])
+
+def case_save_metadata_png(suite):
+    return save_images(suite, "PNG")
+
+def case_save_metadata_jpeg(suite):
+    return save_images(suite, "JPEG")
+
+def case_model_hash(suite):
+    # Cold hash of the checkpoint, in MB
+    index = suite.new_hash_index()
+    index.sha256(os.path.join(suite.comfy_dir, "models", "checkpoints", suite.library["checkpoints"][0]))
+    return suite.args.checkpoint_mb
+
+def case_random_select(suite):
+    images, captions = suite.loaded()
+    node = suite.nodes.D00MYsRandomImages()
+    picked = 0
+    for seed in range(100):
+        picked += len(node.random_images(images, [len(images)], captions, seed=[seed], replacement=[False])[0])
+    return picked
+
+def case_random_select_batch(suite):
+    images, captions = suite.loaded()
+    batch = [torch.cat(images)] if len({image.shape for image in images}) == 1 else images
+    node = suite.nodes.D00MYsRandomImages()
+    picked = 0
+    for seed in range(100):
+        picked += len(node.random_images(batch, [len(images)], captions, seed=[seed], replacement=[False])[0])
+    return picked
+
+def case_jspaint_decode(suite):
+    suite.nodes.jspaint_cache.clear()
+    suite.nodes.decode_jspaint(suite.png)
+    return 1
+
+
+CASES = {
+    "convert": (case_convert, "images"),
+    "load": (case_load, "images"),
+    "load_batch": (case_load_batch, "images"),
+    "load_max_side": (case_load_max_side, "images"),
+    "load_captions": (case_load_captions, "images"),
+    "load_cached": (case_load_cached, "images"),
+    "save_metadata_png": (case_save_metadata_png, "images"),
+    "save_metadata_jpeg": (case_save_metadata_jpeg, "images"),
+    "model_hash": (case_model_hash, "MB"),
+    "random_select": (case_random_select, "images"),
+    "random_select_batch": (case_random_select_batch, "images"),
+    "jspaint_decode": (case_jspaint_decode, "canvases"),
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "-C", PACKAGE_DIR, "describe", "--always", "--dirty"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def environment():
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "numpy": numpy.__version__,
+        "pillow": PIL.__version__,
+    }
+
+def run_case(suite, func, unit, repeat):
+    timings = []
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = func(suite)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {
+        "unit": unit,
+        "items": items,
+        "repeat": repeat,
+        "seconds_best": best,
+        "seconds_median": statistics.median(timings),
+        "per_second": items / best if best > 0 else None,
+    }
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="UTF-8") as fp:
+        baseline = json.load(fp)
+    print(f"\nAgainst {baseline_path} ({baseline['environment'].get('revision')})")
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        change = result["seconds_best"] / before["seconds_best"] - 1
+        print(f"{name:>22} {before['seconds_best']:>9.3f}s -> {result['seconds_best']:>9.3f}s  {change:+7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--count", type=int, default=32, help="Synthetic images")
+    parser.add_argument("--size", type=int, default=768)
+    parser.add_argument("--file-type", default="JPEG", choices=["JPEG", "PNG", "WebP"])
+    parser.add_argument("--max-side", type=int, default=256, help="Decode size of load_max_side")
+    parser.add_argument("--threads", type=int, default=4, help="Decode and save threads")
+    parser.add_argument("--workers", type=int, default=1, help="Conversion processes")
+    parser.add_argument("--loras", type=int, default=200)
+    parser.add_argument("--embeddings", type=int, default=50)
+    parser.add_argument("--checkpoint-mb", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="JSON file of the results, printed when omitted")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    suite = Suite(args)
+    results = {}
+    try:
+        for name in args.cases:
+            func, unit = CASES[name]
+            results[name] = run_case(suite, func, unit, args.repeat)
+            result = results[name]
+            print(f"{name:>22} {result['seconds_best']:>9.3f}s  {result['per_second']:>10.1f} {unit}/s", file=sys.stderr)
+    finally:
+        shutil.rmtree(suite.comfy_dir, ignore_errors=True)
+
+    report = {
+        "environment": environment(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "cases")},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="UTF-8") as fp:
+            json.dump(report, fp, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
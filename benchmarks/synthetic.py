@@ -0,0 +1,71 @@
+"""
+Synthetic datasets for the benchmarks.
+"""
+import os
+from io import BytesIO
+
+import numpy
+from PIL import Image
+
+
+def make_images(directory: str, count: int, size: int = 1024, file_type: str = "JPEG", captions: bool = False, seed: int = 0):
+    os.makedirs(directory, exist_ok=True)
+    rng = numpy.random.default_rng(seed)
+    ext = {"JPEG": ".jpg", "PNG": ".png", "WebP": ".webp"}[file_type]
+    # Smooth gradients plus noise compress like photos, pure noise would not
+    gradient = numpy.linspace(0, 255, size, dtype=numpy.float32)
+    base = numpy.stack([*numpy.meshgrid(gradient, gradient), gradient[::-1, None].repeat(size, 1)], axis=-1)
+    paths = list()
+    for index in range(count):
+        noise = rng.normal(0, 12, base.shape).astype(numpy.float32)
+        pixels = numpy.clip(base + noise + index, 0, 255).astype(numpy.uint8)
+        path = os.path.join(directory, f"image_{index:06}{ext}")
+        Image.fromarray(pixels).save(path, file_type, quality=90)
+        if captions:
+            with open(os.path.join(directory, f"image_{index:06}.txt"), "w", encoding="UTF-8") as fp:
+                fp.write(f"a synthetic picture, number {index}, gradient, noise")
+        paths.append(path)
+    return paths
+
+def make_model_library(comfy_dir: str, folder_paths, loras: int = 100, embeddings: int = 50, checkpoint_mb: int = 64, seed: int = 0):
+    # Fake model files registered in the stub folder_paths, the checkpoint is big enough for hashing to show
+    rng = numpy.random.default_rng(seed)
+    library = {"checkpoints": ["model.safetensors"], "loras": [], "embeddings": []}
+    library["loras"] = [f"{'style' if i % 2 else 'characters'}/lora_{i:05}.safetensors" for i in range(loras)]
+    library["embeddings"] = [f"embedding_{i:05}.pt" for i in range(embeddings)]
+    for folder_name, filenames in library.items():
+        for filename in filenames:
+            path = os.path.join(comfy_dir, "models", folder_name, filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            size = checkpoint_mb * 1024 * 1024 if folder_name == "checkpoints" else 64 * 1024
+            with open(path, "wb") as fp:
+                fp.write(rng.bytes(size))
+        folder_paths.filename_lists[folder_name] = list(filenames)
+    return library
+
+def make_prompt(library: dict, tags: int = 4, seed: int = 0):
+    # Prompt graph as ComfyUI sends it, with LoRA and embedding tags in the positive text
+    rng = numpy.random.default_rng(seed)
+    loras = [library["loras"][i] for i in rng.integers(0, len(library["loras"]), tags)]
+    embeddings = [library["embeddings"][i] for i in rng.integers(0, len(library["embeddings"]), tags)]
+    positive = ", ".join(["a synthetic picture"] + [f"<lora:{lora.rsplit('.', 1)[0]}:0.8>" for lora in loras] + 
+                         [f"embedding:{embedding.rsplit('.', 1)[0]}" for embedding in embeddings])
+    return {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"base_ckpt_name": library["checkpoints"][0]}},
+        "2": {"class_type": "CLIPTextEncode", "inputs": {"text": positive, "clip": ["1", 1]}},
+        "3": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry, lowres", "clip": ["1", 1]}},
+        "4": {"class_type": "KSampler", "inputs": {"seed": 42, "steps": 20, "cfg": 7.0, "sampler_name": "euler", "scheduler": "normal", 
+                                                   "denoise": 1.0, "positive": ["2", 0], "negative": ["3", 0], "model": ["1", 0]}},
+    }
+
+def make_png(size: int = 1024, seed: int = 0):
+    # A painting as the JSPaint widget sends it
+    rng = numpy.random.default_rng(seed)
+    pixels = numpy.zeros((size, size, 4), dtype=numpy.uint8)
+    pixels[..., 3] = 255
+    for _ in range(64):
+        x, y = rng.integers(0, size - size // 8, 2)
+        pixels[y:y + size // 8, x:x + size // 8, :3] = rng.integers(0, 256, 3)
+    buffer = BytesIO()
+    Image.fromarray(pixels, "RGBA").save(buffer, "PNG")
+    return buffer.getvalue()
@@ -0,0 +1,85 @@
+import os
+import pathlib
+
+from .logger import logger
+from .utils import imap_ordered
+from .archives import split_archive_ref, archive_ref, get_archive_index, read_archive_member
+
+# In the order they are searched for, e.g. banana.txt, banana.caption, banana.png.txt, banana.png.caption
+CAPTION_EXTENSIONS = [".txt", ".caption"]
+
+
+def caption_names(image_name: str):
+    image_path = pathlib.PurePath(image_name)
+    return [f"{image_path.stem}{ext}" for ext in CAPTION_EXTENSIONS] + [f"{image_path.name}{ext}" for ext in CAPTION_EXTENSIONS]
+
+def read_caption(path: str):
+    if path is None:
+        return ""
+    if split_archive_ref(path)[1] is not None:
+        return read_archive_member(path).decode("UTF-8")
+    with open(path, "r", encoding="UTF-8") as fp:
+        return str(fp.read())
+
+
+"""
+Finds the caption files of images by listing every directory once, instead of
+probing every candidate file of every image. Images in an archive pair with the
+captions next to them in the archive
+"""
+class CaptionIndex:
+    def __init__(self):
+        self.__directories = {}
+
+    def find(self, image_path: str):
+        # Path of the caption file of the image or None
+        archive_path, member_name = split_archive_ref(image_path)
+        if member_name is not None:
+            return self.__find_in_archive(archive_path, member_name)
+        image_dir = os.path.dirname(image_path)
+        names = self.__listing(image_dir)
+        for name in caption_names(os.path.basename(image_path)):
+            if name in names:
+                return os.path.join(image_dir, name)
+        return None
+
+    def missing(self, images_paths: list):
+        return [image_path for image_path in images_paths if self.find(image_path) is None]
+
+    def read(self, images_paths: list, workers: int = 1):
+        # Captions in the order of the images, empty when there is none
+        found = [self.find(image_path) for image_path in images_paths]
+        return list(imap_ordered(read_caption, found, workers))
+
+    # Private API
+    def __find_in_archive(self, archive_path: str, member_name: str):
+        member_dir, _, image_name = member_name.rpartition("/")
+        try:
+            names = get_archive_index(archive_path).listing(member_dir)
+        except Exception as e:
+            logger.error(f"Cannot list captions in {archive_path}: {e}")
+            return None
+        for name in caption_names(image_name):
+            if name in names:
+                return archive_ref(archive_path, f"{member_dir}/{name}" if member_dir else name)
+        return None
+
+    def __listing(self, directory: str):
+        if directory not in self.__directories:
+            try:
+                with os.scandir(directory or ".") as entries:
+                    self.__directories[directory] = {entry.name for entry in entries if entry.is_file()}
+            except OSError as e:
+                logger.error(f"Cannot list captions in {directory}: {e}")
+                self.__directories[directory] = set()
+        return self.__directories[directory]
+
+
+def read_images_captions(images_paths: list, workers: int = 1):
+    index = CaptionIndex()
+    captions = index.read(images_paths, workers)
+    missing = index.missing(images_paths)
+    if missing:
+        logger.info(f"{len(missing)} of {len(images_paths)} images have no caption")
+        logger.debug(f"Images without caption: {missing}")
+    return captions
@@ -0,0 +1,65 @@
+import os
+import json
+
+from .logger import logger
+
+MANIFEST_NAME = ".d00mys_conversions.json"
+
+
+"""
+Sources converted into an output directory with their size and mtime at the time,
+so Images_Converter can skip the ones that did not change since
+"""
+class ConversionManifest:
+    def __init__(self, output_directory: str):
+        self.path = os.path.join(output_directory, MANIFEST_NAME)
+        self.__entries = {}
+        self.__changed = False
+        try:
+            with open(self.path, "r", encoding="UTF-8") as fp:
+                self.__entries = json.load(fp)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Cannot read conversion manifest {self.path}, converting everything: {e}")
+
+    def is_unchanged(self, image_path: str, save_path: str, convert_to: str, max_side: int = 0):
+        try:
+            source = os.stat(image_path)
+            output = os.stat(save_path)
+        except OSError:
+            return False
+        entry = self.__entries.get(self.__key(image_path, convert_to))
+        if entry is not None:
+            return entry == self.__entry(source, save_path, max_side)
+        # Converted before there was a manifest, always at full size
+        return max_side <= 0 and output.st_mtime_ns >= source.st_mtime_ns
+
+    def add(self, image_path: str, save_path: str, convert_to: str, max_side: int = 0):
+        try:
+            source = os.stat(image_path)
+        except OSError:
+            return
+        self.__entries[self.__key(image_path, convert_to)] = self.__entry(source, save_path, max_side)
+        self.__changed = True
+
+    def save(self):
+        if not self.__changed:
+            return
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="UTF-8") as fp:
+                json.dump(self.__entries, fp)
+            os.replace(temp_path, self.path)
+            self.__changed = False
+        except Exception as e:
+            logger.warning(f"Cannot write conversion manifest {self.path}: {e}")
+
+    # Private API
+    def __key(self, image_path: str, convert_to: str):
+        return f"{convert_to}:{os.path.abspath(image_path)}"
+
+    def __entry(self, source: os.stat_result, save_path: str, max_side: int):
+        # max_side is only stored when set, so entries of full size conversions stay valid
+        entry = [source.st_size, source.st_mtime_ns, os.path.abspath(save_path)]
+        return entry + [max_side] if max_side > 0 else entry
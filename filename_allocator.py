@@ -0,0 +1,96 @@
+import os
+import re
+import time
+import threading
+
+# Collisions in a row (another process saving with the same prefix) before rescanning the directory
+RESCAN_AFTER_COLLISIONS = 16
+
+
+"""
+Hands out numbered file names ({prefix}_{00001}{suffix}) in a directory.
+The highest number of every prefix is found with one scan of the directory and then cached,
+names are claimed by creating the file with O_EXCL so several processes can share the directory
+"""
+class FilenameAllocator:
+    def __init__(self):
+        self.__counters = {}
+        self.__lock = threading.Lock()
+
+    def claim(self, directory: str, prefix: str, suffix: str, start: int = 1):
+        key = (os.path.abspath(directory), prefix, suffix)
+        with self.__lock:
+            if key not in self.__counters:
+                self.__counters[key] = self.__scan(*key)
+            num = max(self.__counters[key] + 1, start)
+            collisions = 0
+            while True:
+                path = os.path.join(directory, f"{prefix}_{str(num).zfill(5)}{suffix}")
+                try:
+                    os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                    break
+                except FileExistsError:
+                    collisions += 1
+                    num += 1
+                    if collisions % RESCAN_AFTER_COLLISIONS == 0:
+                        num = max(num, self.__scan(*key) + 1)
+            self.__counters[key] = num
+            return path
+
+    def release(self, path: str):
+        # Removes a claimed file that could not be written
+        try:
+            if os.path.getsize(path) == 0:
+                os.remove(path)
+        except OSError:
+            pass
+
+    # Private API
+    def __scan(self, directory: str, prefix: str, suffix: str):
+        pattern = re.compile(rf"{re.escape(prefix)}_(\d+){re.escape(suffix)}")
+        highest = 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    match = pattern.fullmatch(entry.name)
+                    if match:
+                        highest = max(highest, int(match.group(1)))
+        except FileNotFoundError:
+            pass
+        return highest
+
+
+def format_prefix(filename_prefix: str, width: int = 0, height: int = 0):
+    # Same %variables% as folder_paths.get_save_image_path
+    if "%" not in filename_prefix:
+        return filename_prefix
+    now = time.localtime()
+    variables = {
+        "%width%": str(width),
+        "%height%": str(height),
+        "%year%": str(now.tm_year),
+        "%month%": str(now.tm_mon).zfill(2),
+        "%day%": str(now.tm_mday).zfill(2),
+        "%hour%": str(now.tm_hour).zfill(2),
+        "%minute%": str(now.tm_min).zfill(2),
+        "%second%": str(now.tm_sec).zfill(2),
+    }
+    for variable, value in variables.items():
+        filename_prefix = filename_prefix.replace(variable, value)
+    return filename_prefix
+
+def resolve_save_prefix(filename_prefix: str, output_dir: str, width: int = 0, height: int = 0):
+    # (full output folder, filename, subfolder) like folder_paths.get_save_image_path, without
+    # listing the folder for a counter, the numbers are handed out by filename_allocator
+    filename_prefix = os.path.normpath(format_prefix(filename_prefix, width, height))
+    subfolder = os.path.dirname(filename_prefix)
+    filename = os.path.basename(filename_prefix)
+    output_dir = os.path.abspath(output_dir)
+    full_output_folder = os.path.join(output_dir, subfolder)
+    if os.path.commonpath((output_dir, os.path.abspath(full_output_folder))) != output_dir:
+        raise Exception(f"Saving image outside the output folder is not allowed. Full output folder: {os.path.abspath(full_output_folder)}, output dir: {output_dir}")
+    os.makedirs(full_output_folder, exist_ok=True)
+    return full_output_folder, filename, subfolder
+
+
+filename_allocator = FilenameAllocator()
@@ -0,0 +1,119 @@
+import os
+import hashlib
+import threading
+
+import folder_paths
+
+from .logger import logger
+from .lazy import lazy_import
+from .utils import get_ext_dir
+
+sqlite3 = lazy_import("sqlite3")
+
+HASH_BUFFER_SIZE = 8 * 1024 * 1024
+PRECOMPUTE_FOLDERS = ["checkpoints", "loras", "embeddings"]
+# Hashing every model at startup is opt-in, otherwise they are hashed when metadata first needs them
+PRECOMPUTE_ENABLED = os.environ.get("D00MYS_PRECOMPUTE_HASHES", "").lower() not in ("", "0", "false", "no")
+
+
+def compute_sha256(file_path: str):
+    sha256_hash = hashlib.sha256()
+    buffer = bytearray(HASH_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            sha256_hash.update(view[:read])
+    return sha256_hash.hexdigest()
+
+
+"""
+SHA-256 of model files stored in one SQLite database of the extension, keyed by path, size and mtime.
+Nothing is written next to the models, a file is hashed again only when it changed
+"""
+class HashIndex:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.__lock = threading.Lock()
+        self.__hashing = {}
+        self.__thread = None
+        # Opened on first use, not while ComfyUI imports the node pack
+        self.__db = None
+
+    def get(self, file_path: str):
+        # Known hash of the file or None if it was never hashed or changed since
+        path, size, mtime_ns = self.__key(file_path)
+        with self.__lock:
+            row = self.__connection().execute("SELECT sha256 FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?", (path, size, mtime_ns)).fetchone()
+        return row[0] if row else None
+
+    def sha256(self, file_path: str):
+        sha256 = self.get(file_path)
+        if sha256 is not None:
+            return sha256
+        # Only one thread hashes a given file, the others wait for its result
+        path = os.path.abspath(file_path)
+        with self.__lock:
+            file_lock = self.__hashing.setdefault(path, threading.Lock())
+        with file_lock:
+            sha256 = self.get(file_path)
+            if sha256 is None:
+                key = self.__key(file_path)
+                sha256 = compute_sha256(file_path)
+                with self.__lock:
+                    db = self.__connection()
+                    db.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)", (*key, sha256))
+                    db.commit()
+        with self.__lock:
+            self.__hashing.pop(path, None)
+        return sha256
+
+    def precompute(self, folder_names: list = PRECOMPUTE_FOLDERS):
+        hashed = 0
+        for folder_name in folder_names:
+            try:
+                filenames = folder_paths.get_filename_list(folder_name)
+            except Exception as e:
+                logger.warning(f"Cannot list {folder_name} to hash: {e}")
+                continue
+            for filename in filenames:
+                file_path = folder_paths.get_full_path(folder_name, filename)
+                if file_path is None:
+                    continue
+                try:
+                    if self.get(file_path) is None:
+                        self.sha256(file_path)
+                        hashed += 1
+                except Exception as e:
+                    logger.warning(f"Cannot hash {file_path}: {e}")
+        logger.info(f"Hashed {hashed} new model files")
+
+    def start_precompute(self, folder_names: list = PRECOMPUTE_FOLDERS):
+        if self.__thread is not None and self.__thread.is_alive():
+            return self.__thread
+        self.__thread = threading.Thread(target=self.precompute, args=(folder_names,), name="D00MYsHashIndex", daemon=True)
+        self.__thread.start()
+        return self.__thread
+
+    # Private API
+    def __connection(self):
+        # Called with the lock held
+        if self.__db is None:
+            try:
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                self.__db = sqlite3.connect(self.db_path, check_same_thread=False)
+            except Exception as e:
+                logger.warning(f"Cannot open hash index {self.db_path}, hashes will only be kept in memory: {e}")
+                self.__db = sqlite3.connect(":memory:", check_same_thread=False)
+            self.__db.execute("CREATE TABLE IF NOT EXISTS hashes (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT)")
+            self.__db.commit()
+        return self.__db
+
+    def __key(self, file_path: str):
+        stat = os.stat(file_path)
+        return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+
+hash_index = HashIndex(get_ext_dir("cache/hashes.sqlite3"))
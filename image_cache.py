@@ -0,0 +1,130 @@
+import os
+import glob
+import hashlib
+import threading
+from collections import OrderedDict
+
+from .logger import logger
+from .lazy import lazy_import
+from .utils import get_ext_dir, tensor2numpy
+from .archives import split_archive_ref
+from .metrics import metrics
+
+numpy = lazy_import("numpy")
+torch = lazy_import("torch")
+
+IMAGE_CACHE_MAX_BYTES = 2 * 1024 ** 3
+IMAGE_CACHE_MODES = ["memory", "memory+disk", "none"]
+
+
+def file_key(path: str):
+    # Members of an archive change with the archive
+    stat = os.stat(split_archive_ref(path)[0])
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+def files_fingerprint(paths: list, *extra):
+    # Changes whenever one of the files is added, removed, replaced or touched
+    sha1 = hashlib.sha1(repr(extra).encode())
+    for path in paths:
+        try:
+            sha1.update(repr(file_key(path)).encode())
+        except OSError:
+            sha1.update(path.encode())
+    return sha1.hexdigest()
+
+
+"""
+Decoded images keyed by (path, mtime, size), in an in-memory LRU limited to max_bytes
+with an optional on-disk tier of uint8 .npy files that are memory-mapped on read
+"""
+class ImageCache:
+    def __init__(self, max_bytes: int, disk_dir: str):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def load(self, path: str, loader, disk: bool = False, variant: str = ""):
+        # variant tells apart the images decoded differently from the same file
+        key = file_key(path)
+        if variant:
+            key = (f"{key[0]}{variant}",) + key[1:]
+        with self.__lock:
+            tensor = self.__entries.get(key)
+            if tensor is not None:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                metrics.count("cache_hits")
+                return tensor
+        tensor = None
+        if disk:
+            with metrics.timer("cache.read_disk"):
+                tensor = self.__load_disk(key)
+        if tensor is None:
+            self.misses += 1
+            metrics.count("cache_misses")
+            tensor = loader(path)
+            if disk:
+                self.__save_disk(key, tensor)
+        else:
+            self.disk_hits += 1
+            metrics.count("cache_disk_hits")
+        self.__put(key, tensor)
+        return tensor
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.bytes = 0
+
+    # Private API
+    def __put(self, key, tensor):
+        size = tensor.element_size() * tensor.nelement()
+        if size > self.max_bytes:
+            return
+        with self.__lock:
+            if key in self.__entries:
+                return
+            self.__entries[key] = tensor
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self.__entries.popitem(last=False)
+                self.bytes -= evicted.element_size() * evicted.nelement()
+
+    def __disk_path(self, key):
+        path_hash = hashlib.sha1(key[0].encode()).hexdigest()
+        return os.path.join(self.disk_dir, f"{path_hash}_{key[1]}_{key[2]}.npy"), path_hash
+
+    def __load_disk(self, key):
+        disk_path, _ = self.__disk_path(key)
+        if not os.path.exists(disk_path):
+            return None
+        try:
+            array = numpy.load(disk_path, mmap_mode="r")
+            tensor = torch.empty(array.shape, dtype=torch.float32)
+            numpy.divide(array, 255.0, out=tensor.numpy(), dtype=numpy.float32)
+            return tensor
+        except Exception as e:
+            logger.warning(f"Cannot read cached image {disk_path}: {e}")
+            return None
+
+    def __save_disk(self, key, tensor):
+        disk_path, path_hash = self.__disk_path(key)
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            # Only keep the latest version of every source file
+            for stale_path in glob.glob(os.path.join(self.disk_dir, f"{path_hash}_*.npy")):
+                os.remove(stale_path)
+            temp_path = f"{disk_path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as fp:
+                numpy.save(fp, tensor2numpy(tensor))
+            os.replace(temp_path, disk_path)
+        except Exception as e:
+            logger.warning(f"Cannot write cached image {disk_path}: {e}")
+
+
+image_cache = ImageCache(IMAGE_CACHE_MAX_BYTES, get_ext_dir("cache/images"))
@@ -1,11 +1,75 @@
+import os
+import json
+import time
 import shutil
 
+from server import PromptServer
+
 from .logger import logger
 from .utils import get_ext_dir, get_comfy_dir
 
+# Written in the installed copy, lists the files of the bundled JSPaint it was made from
+JSPAINT_STAMP_NAME = ".d00mys_jspaint.json"
+
 #################################################################### Installing JS
 
+def jspaint_manifest(directory: str):
+    # Relative path of every file with its size and mtime
+    manifest = {}
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in files:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            manifest[os.path.relpath(path, directory).replace(os.sep, "/")] = [stat.st_size, stat.st_mtime_ns]
+    return manifest
+
+def read_jspaint_stamp(stamp_path: str):
+    try:
+        with open(stamp_path, "r", encoding="UTF-8") as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Cannot read JSPaint install stamp {stamp_path}, reinstalling: {e}")
+        return {}
+
+def copy_jspaint(source_dir: str, target_dir: str):
+    # Copies the files that changed since the last install, returns how many were copied
+    manifest = jspaint_manifest(source_dir)
+    stamp_path = os.path.join(target_dir, JSPAINT_STAMP_NAME)
+    installed = read_jspaint_stamp(stamp_path)
+    if installed == manifest and os.path.exists(os.path.join(target_dir, "index.html")):
+        return 0
+    copied = 0
+    for relpath, entry in manifest.items():
+        target_path = os.path.join(target_dir, relpath)
+        if installed.get(relpath) == entry and os.path.exists(target_path):
+            continue
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        # copy2 keeps the mtime so an interrupted install resumes where it stopped
+        shutil.copy2(os.path.join(source_dir, relpath), target_path)
+        copied += 1
+    temp_path = f"{stamp_path}.tmp"
+    with open(temp_path, "w", encoding="UTF-8") as fp:
+        json.dump(manifest, fp)
+    os.replace(temp_path, stamp_path)
+    return copied
+
+def serve_jspaint(source_dir: str):
+    # No copy at all, the bundled JSPaint is served from the extension directory
+    PromptServer.instance.routes.static("/jspaint", source_dir)
+
 def install_js():
-    logger.info(f"Installing JSPAINT")
-    # Copy JsPaint before extensions folder
-    shutil.copytree(get_ext_dir("jspaint"), get_comfy_dir("web/jspaint"), dirs_exist_ok=True)
+    start = time.perf_counter()
+    source_dir = get_ext_dir("jspaint")
+    target_dir = get_comfy_dir("web/jspaint")
+    try:
+        copied = copy_jspaint(source_dir, target_dir)
+        if copied:
+            logger.info(f"Installed JSPAINT ({copied} files changed) in {time.perf_counter() - start:.2f}s")
+        else:
+            logger.info(f"JSPAINT is up to date ({time.perf_counter() - start:.2f}s)")
+    except OSError as e:
+        logger.warning(f"Cannot install JSPAINT into {target_dir}, serving it from {source_dir}: {e}")
+        serve_jspaint(source_dir)
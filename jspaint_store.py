@@ -0,0 +1,46 @@
+import os
+import re
+import hashlib
+
+import folder_paths
+
+# Value of the JSPaint widget once its canvas is uploaded
+JSPAINT_VALUE_PREFIX = "jspaint:sha256:"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+"""
+JSPaint canvases stored by the SHA-256 of their PNG in the ComfyUI input folder,
+so prompts and workflows only carry the hash
+"""
+def store_dir():
+    return os.path.join(folder_paths.get_input_directory(), "jspaint")
+
+def canvas_path(png_hash: str):
+    if not SHA256_PATTERN.fullmatch(png_hash):
+        raise ValueError(f"Invalid canvas hash '{png_hash}'")
+    return os.path.join(store_dir(), f"{png_hash}.png")
+
+def put_canvas(png_bytes: bytes):
+    if not png_bytes.startswith(PNG_SIGNATURE):
+        raise ValueError("Canvas is not a PNG")
+    png_hash = hashlib.sha256(png_bytes).hexdigest()
+    path = canvas_path(png_hash)
+    if not os.path.exists(path):
+        os.makedirs(store_dir(), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as fp:
+            fp.write(png_bytes)
+        os.replace(temp_path, path)
+    return png_hash
+
+def get_canvas(png_hash: str):
+    with open(canvas_path(png_hash), "rb") as fp:
+        return fp.read()
+
+def is_canvas_value(value: str):
+    return isinstance(value, str) and value.startswith(JSPAINT_VALUE_PREFIX)
+
+def canvas_value_hash(value: str):
+    return value[len(JSPAINT_VALUE_PREFIX):]
@@ -0,0 +1,40 @@
+import sys
+import types
+import threading
+import importlib
+
+
+"""
+Stand-in for a module that is imported on the first attribute access, so loading the
+node pack does not pay for torch, numpy, PIL or piexif before a node runs.
+Once loaded, the attributes of the module are copied on the stand-in and accessed directly
+"""
+class LazyModule(types.ModuleType):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__lock = threading.Lock()
+        self.__module = None
+
+    def __getattr__(self, attr: str):
+        return getattr(self.__load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self.__name__}'>"
+
+    # Private API
+    def __load(self):
+        # Decoding threads can be the first to touch the module
+        with self.__lock:
+            if self.__module is None:
+                module = importlib.import_module(self.__name__)
+                self.__dict__.update(module.__dict__)
+                self.__module = module
+        return self.__module
+
+
+def lazy_import(name: str):
+    # The module itself when it is already imported, ComfyUI loads torch and PIL before the node packs
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
@@ -1,15 +1,17 @@
 import os
-import hashlib
 import folder_paths
 import re
+import threading
 from typing import List
 
+from .hash_index import hash_index
+
 # Taken from : https://github.com/alexopus/ComfyUI-Image-Saver/blob/main/utils.py
 
 
 """
-Given the file path, finds a matching sha256 file, or creates one
-based on the headers in the source file
+Given the file path, reads a matching sha256 file if there is one, otherwise the hash
+comes from the central hash index (hashed once per path, size and mtime)
 """
 def get_sha256(file_path: str):
     file_no_ext = os.path.splitext(file_path)[0]
@@ -22,18 +24,7 @@ def get_sha256(file_path: str):
         except OSError as e:
             print(f"ComfyUI-Image-Saver: Error reading existing hash file: {e}")
 
-    sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-
-    try:
-        with open(hash_file, "w") as f:
-            f.write(sha256_hash.hexdigest())
-    except OSError as e:
-        print(f"ComfyUI-Image-Saver: Error writing hash to {hash_file}: {e}")
-
-    return sha256_hash.hexdigest()
+    return hash_index.sha256(file_path)
 
 """
 Represent the given embedding name as key as detected by civitAI
@@ -48,11 +39,65 @@ NB: this should also work fine for Lycoris
 def civitai_lora_key_name(lora: str):
     return f'LORA:{lora}'
 
+"""
+Lookups of names in the file list of a models folder. The list is indexed by name and by
+name without extension, and rebuilt only when folder_paths returns a different list
+"""
+class FilenameIndex:
+    def __init__(self, folder_name: str):
+        self.folder_name = folder_name
+        self.__filenames = None
+        self.__names = {}
+        self.__stems = {}
+        self.__matches = {}
+        self.__lock = threading.Lock()
+
+    def ends_with(self, suffix: str):
+        # A whole name (or the name in a subfolder) ending with suffix, else any name ending with it
+        return self.__find("ends_with", suffix, lambda names, stems: names.get(suffix), 
+                           lambda filename: filename.endswith(suffix))
+
+    def starts_with(self, prefix: str):
+        # The name without extension equal to prefix, else any name starting with it
+        return self.__find("starts_with", prefix, lambda names, stems: stems.get(prefix), 
+                           lambda filename: filename.startswith(prefix))
+
+    # Private API
+    def __find(self, kind, value, indexed, matches):
+        with self.__lock:
+            filenames = self.__refresh()
+            key = (kind, value)
+            if key not in self.__matches:
+                match = indexed(self.__names, self.__stems)
+                if match is None:
+                    match = next((x for x in filenames if matches(x)), None)
+                self.__matches[key] = match
+            return self.__matches[key]
+
+    def __refresh(self):
+        filenames = folder_paths.get_filename_list(self.folder_name)
+        if filenames is self.__filenames or filenames == self.__filenames:
+            return self.__filenames
+        self.__filenames = filenames
+        self.__names = {}
+        self.__stems = {}
+        self.__matches = {}
+        for filename in filenames:
+            basename = filename.replace("\\", "/").rsplit("/", 1)[-1]
+            for name in (filename, basename):
+                self.__names.setdefault(name, filename)
+                self.__stems.setdefault(os.path.splitext(name)[0], filename)
+        return filenames
+
+
+lora_index = FilenameIndex("loras")
+embedding_index = FilenameIndex("embeddings")
+
 """
 Based on a embedding name, eg: EasyNegative, finds the path as known in comfy, including extension
 """
 def full_embedding_path_for(embedding: str):
-    matching_embedding = next((x for x in __list_embeddings() if x.startswith(embedding)), None)
+    matching_embedding = embedding_index.starts_with(embedding)
     if matching_embedding == None:
         return None
     return folder_paths.get_full_path("embeddings", matching_embedding)
@@ -70,17 +115,11 @@ def full_lora_path_for(lora: str):
         lora += ".safetensors"
 
     # Find the matching lora path
-    matching_lora = next((x for x in __list_loras() if x.endswith(lora)), None)
+    matching_lora = lora_index.ends_with(lora)
     if matching_lora is None:
         return None
     return folder_paths.get_full_path("loras", matching_lora)
 
-def __list_loras():
-    return folder_paths.get_filename_list("loras")
-
-def __list_embeddings():
-    return folder_paths.get_filename_list("embeddings")
-
 
 # Taken from : https://github.com/alexopus/ComfyUI-Image-Saver/blob/main/prompt_metadata_extractor.py
 
@@ -94,9 +133,9 @@ see: https://github.com/civitai/civitai/blob/d83262f401fb372c375e6222d8c2413fa22
 """
 class PromptMetadataExtractor:
     # Anything that follows embedding:<characters except , or whitespace
-    EMBEDDING = r'embedding:([^,\s\(\)\:]+)'
+    EMBEDDING = re.compile(r'embedding:([^,\s\(\)\:]+)', re.IGNORECASE | re.MULTILINE)
     # Anything that follows <lora:NAME> with allowance for :weight, :weight.fractal or LBW
-    LORA = r'<lora:([^>:]+)(?::[^>]+)?>'
+    LORA = re.compile(r'<lora:([^>:]+)(?::[^>]+)?>', re.IGNORECASE | re.MULTILINE)
 
     def __init__(self, prompts: List[str]):
         self.__embeddings = {}
@@ -120,11 +159,11 @@ class PromptMetadataExtractor:
     # Private API
     def __perform(self, prompts):
         for prompt in prompts:
-            embeddings = re.findall(self.EMBEDDING, prompt, re.IGNORECASE | re.MULTILINE)
+            embeddings = self.EMBEDDING.findall(prompt)
             for embedding in embeddings:
                 self.__extract_embedding_information(embedding)
             
-            loras = re.findall(self.LORA, prompt, re.IGNORECASE | re.MULTILINE)
+            loras = self.LORA.findall(prompt)
             for lora in loras:
                 self.__extract_lora_information(lora)
 
@@ -0,0 +1,214 @@
+import os
+import time
+import threading
+from functools import wraps
+
+from .logger import logger
+
+# Off unless D00MYS_METRICS=1, timers are then a shared no-op and nodes are not wrapped
+METRICS_ENABLED = os.environ.get("D00MYS_METRICS", "").lower() not in ("", "0", "false", "no")
+# Optional Prometheus text file written after every node run, e.g. for the node_exporter textfile collector
+METRICS_FILE = os.environ.get("D00MYS_METRICS_FILE") or None
+RECENT_RUNS_SIZE = 32
+
+
+def format_bytes(value: int):
+    if value < 1024 * 1024:
+        return f"{value / 1024:.1f}KB"
+    return f"{value / (1024 * 1024):.1f}MB"
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_TIMER = NullTimer()
+
+
+class Timer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+"""
+Timings and counters of one node execution, stages are [calls, seconds]
+"""
+class RunStats:
+    def __init__(self, node: str):
+        self.node = node
+        self.started = time.time()
+        self.seconds = 0.0
+        self.stages = {}
+        self.counters = {}
+
+    def as_dict(self):
+        return {
+            "node": self.node,
+            "started": self.started,
+            "seconds": self.seconds,
+            "stages": {name: {"calls": calls, "seconds": seconds} for name, (calls, seconds) in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+    def summary(self):
+        parts = [f"{self.node}: {self.seconds:.3f}s"]
+        images = self.counters.get("images")
+        if images and self.seconds > 0:
+            parts.append(f"{images} images ({images / self.seconds:.1f} images/s)")
+        for name, (calls, seconds) in sorted(self.stages.items(), key=lambda stage: stage[1][1], reverse=True):
+            parts.append(f"{name} {seconds:.3f}s/{calls}")
+        for name, value in sorted(self.counters.items()):
+            if name != "images":
+                parts.append(f"{name} {format_bytes(value)}" if name.startswith("bytes") else f"{name} {value}")
+        return ", ".join(parts)
+
+
+"""
+Scoped timers and counters around the stages of the nodes, aggregated per node run and in
+totals since ComfyUI started. Stages running on worker threads are added up, so their
+seconds can be more than the run time
+"""
+class Metrics:
+    def __init__(self, enabled: bool = METRICS_ENABLED, prometheus_file: str = METRICS_FILE):
+        self.enabled = enabled
+        self.prometheus_file = prometheus_file
+        self.__lock = threading.Lock()
+        self.__totals = RunStats("total")
+        self.__runs = {}
+        self.__recent = []
+        self.__run = None
+        self.__start = 0.0
+
+    def timer(self, name: str):
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name)
+
+    def record(self, name: str, seconds: float):
+        with self.__lock:
+            for stats in self.__targets():
+                stage = stats.stages.setdefault(name, [0, 0.0])
+                stage[0] += 1
+                stage[1] += seconds
+
+    def count(self, name: str, value: int = 1):
+        if not self.enabled:
+            return
+        with self.__lock:
+            for stats in self.__targets():
+                stats.counters[name] = stats.counters.get(name, 0) + value
+
+    def node(self, node_name: str):
+        # Decorates the FUNCTION of a node, every call is one run
+        def decorator(func):
+            if not self.enabled:
+                return func
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                self.__begin(node_name)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.__end()
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        with self.__lock:
+            return {
+                "enabled": self.enabled,
+                "total": self.__totals.as_dict(),
+                "nodes": {name: stats.as_dict() for name, stats in self.__runs.items()},
+                "recent_runs": [stats.as_dict() for stats in self.__recent],
+            }
+
+    def prometheus(self):
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP d00mys_stage_seconds_total Seconds spent in a stage of a D00MYs node.",
+            "# TYPE d00mys_stage_seconds_total counter",
+        ]
+        for node, stats in snapshot["nodes"].items():
+            for stage, values in stats["stages"].items():
+                lines.append(f'd00mys_stage_seconds_total{{node="{node}",stage="{stage}"}} {values["seconds"]:.6f}')
+        lines += [
+            "# HELP d00mys_stage_calls_total Calls of a stage of a D00MYs node.",
+            "# TYPE d00mys_stage_calls_total counter",
+        ]
+        for node, stats in snapshot["nodes"].items():
+            for stage, values in stats["stages"].items():
+                lines.append(f'd00mys_stage_calls_total{{node="{node}",stage="{stage}"}} {values["calls"]}')
+        lines += [
+            "# HELP d00mys_node_runs_total Executions of a D00MYs node.",
+            "# TYPE d00mys_node_runs_total counter",
+        ]
+        for node, stats in snapshot["nodes"].items():
+            lines.append(f'd00mys_node_runs_total{{node="{node}"}} {stats["counters"].get("runs", 0)}')
+        lines += [
+            "# HELP d00mys_node_seconds_total Seconds spent running a D00MYs node.",
+            "# TYPE d00mys_node_seconds_total counter",
+        ]
+        for node, stats in snapshot["nodes"].items():
+            lines.append(f'd00mys_node_seconds_total{{node="{node}"}} {stats["seconds"]:.6f}')
+        counters = sorted({name for stats in snapshot["nodes"].values() for name in stats["counters"] if name != "runs"})
+        for name in counters:
+            lines += [f"# TYPE d00mys_{name}_total counter"]
+            for node, stats in snapshot["nodes"].items():
+                if name in stats["counters"]:
+                    lines.append(f'd00mys_{name}_total{{node="{node}"}} {stats["counters"][name]}')
+        return "\n".join(lines) + "\n"
+
+    # Private API
+    def __targets(self):
+        # Called with the lock held
+        if self.__run is None:
+            return (self.__totals,)
+        return (self.__totals, self.__run, self.__runs[self.__run.node])
+
+    def __begin(self, node_name: str):
+        with self.__lock:
+            self.__run = RunStats(node_name)
+            self.__runs.setdefault(node_name, RunStats(node_name))
+        self.__start = time.perf_counter()
+
+    def __end(self):
+        seconds = time.perf_counter() - self.__start
+        with self.__lock:
+            run = self.__run
+            self.__run = None
+            run.seconds = seconds
+            node_stats = self.__runs[run.node]
+            node_stats.seconds += seconds
+            node_stats.counters["runs"] = node_stats.counters.get("runs", 0) + 1
+            self.__totals.seconds += seconds
+            self.__recent.append(run)
+            del self.__recent[:-RECENT_RUNS_SIZE]
+        logger.info(f"Metrics {run.summary()}")
+        if self.prometheus_file:
+            self.__write_prometheus()
+
+    def __write_prometheus(self):
+        temp_path = f"{self.prometheus_file}.tmp"
+        try:
+            with open(temp_path, "w", encoding="UTF-8") as fp:
+                fp.write(self.prometheus())
+            os.replace(temp_path, self.prometheus_file)
+        except OSError as e:
+            logger.warning(f"Cannot write metrics to {self.prometheus_file}: {e}")
+
+
+metrics = Metrics()
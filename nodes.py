@@ -1,25 +1,46 @@
 import os
 import json
-import piexif
-import piexif.helper
+import math
 import time
 from io import BytesIO
 import base64
 import pathlib
-import uuid
 import random
-from PIL import Image
-from PIL.PngImagePlugin import PngInfo
+import hashlib
+import threading
+from queue import SimpleQueue
+from collections import OrderedDict, deque
+from functools import partial
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-import folder_paths
 from comfy.utils import ProgressBar
 
 from .logger import logger
-from .utils import get_comfy_dir, validate_load_images, list_images_paths, pil2tensor, tensor2pil, IMAGES_TYPES
+from .lazy import lazy_import
+from .utils import get_comfy_dir, validate_load_images, iter_images_paths, is_image_path, imap_ordered, pil2tensor, tensor2numpy, numpy2pil, \
+                   reduced_size, reduce_image
 from .metadata_extractor import PromptMetadataExtractor, get_sha256
+from .image_cache import image_cache, files_fingerprint, IMAGE_CACHE_MODES
+from .filename_allocator import filename_allocator, resolve_save_prefix
+from .captions import CaptionIndex, read_images_captions
+from .conversion_manifest import ConversionManifest
+from .jspaint_store import get_canvas, is_canvas_value, canvas_value_hash
+from .metrics import metrics
+from .shards import get_shard_writer, DEFAULT_SHARD_SIZE_MB
+from .archives import is_archive_path, is_archive_member, split_archive_ref, iter_archive_images, image_source
+
+torch = lazy_import("torch")
+Image = lazy_import("PIL.Image")
+PngImagePlugin = lazy_import("PIL.PngImagePlugin")
+piexif = lazy_import("piexif")
+piexif_helper = lazy_import("piexif.helper")
 
 
 CATEGORY_STRING = "💀 D00MYs"
+LOAD_OUTPUT_MODES = ["list", "batch"]
+SAVE_OUTPUT_MODES = ["files", "shards"]
 CONVERT_TO_TYPES = ["PNG", "JPEG", "GIF", "BMP", "TIFF", "WebP", "ICO"]
 CONVERT_TO_TYPES_EXT = {
     "PNG": ".png", 
@@ -64,204 +85,368 @@ def parse_checkpoint_name_without_extension(ckpt_name):
 def split_paths(paths: str):
     splited_paths_1 = paths.split(",")
     splited_paths_2 = paths.split("\n")
-    return list(set(splited_paths_1 + splited_paths_2))
+    # Keep the given order so windows over the images are stable between runs
+    return list(dict.fromkeys(splited_paths_1 + splited_paths_2))
 
-def load_image(path: str):
-    with Image.open(path) as image:
-        tensor = pil2tensor(image)
+def load_image(path: str, out=None, max_side: int = 0):
+    with metrics.timer("load.open"):
+        source = image_source(path)
+        image = Image.open(source)
+    if metrics.enabled:
+        metrics.count("bytes_read", os.path.getsize(path) if source is path else source.getbuffer().nbytes)
+    with image, metrics.timer("load.decode"):
+        tensor = pil2tensor(reduce_image(image, max_side), out=out)
         return tensor
 
-def load_images(paths: list):
-    results = []
+def probe_image_size(path: str, max_side: int = 0):
+    # Only reads the header, the size is the one load_image decodes to
+    with metrics.timer("load.probe"), Image.open(image_source(path)) as image:
+        return reduced_size(image.size, max_side)
+
+def iter_images_from_paths(paths: list, recursive: bool = False, include: str = "", exclude: str = ""):
+    # Images given by path are always loaded, filters only apply to directories and archives
     for path in paths:
-        if os.path.isfile(path):
-            if pathlib.Path(path).suffix in IMAGES_TYPES:
-                # Load image
-                results.append(load_image(path))
+        archive_path, member_name = split_archive_ref(path)
+        if member_name is not None:
+            # One image of an archive, path/to/archive.zip#member.png
+            if is_image_path(member_name) and os.path.isfile(archive_path) and is_archive_member(path):
+                yield path
             else:
-                logger.error(f"Cannot load {path} because it's not a valid image type.")
-        elif os.path.isdir(path):
-            # Load all directory images
-            images_paths = list_images_paths(path)
-            for image_path in images_paths:
-                results.append(load_image(image_path))
-        else:
-            logger.error(f"Cannot load {path} because it does not exist.")
-    return results
-
-def load_caption(path: str):
-    image_path = pathlib.Path(path)
-    image_name = image_path.stem
-    image_dir = str(image_path.parent)
-    image_ext = image_path.suffix
-    search_for = [
-        f"{os.path.join(image_dir, image_name)}.txt",
-        f"{os.path.join(image_dir, image_name)}.caption",
-        f"{os.path.join(image_dir, image_name)}{image_ext}.txt",
-        f"{os.path.join(image_dir, image_name)}{image_ext}.caption",
-    ]
-    logger.debug(f"Search for: {search_for}")
-    for search in search_for:
-        if os.path.exists(search):
-            logger.debug(f"Found: {search}")
-            # Load caption
-            with open(search, "r", encoding="UTF-8") as fp:
-                return str(fp.read())
-    # If None found return empty String
-    return ""
-
-def load_images_with_captions(paths: list):
-    images = list()
-    captions = list()
-    for path in paths:
-        if os.path.isfile(path):
-            if pathlib.Path(path).suffix in IMAGES_TYPES:
-                captions.append(load_caption(path))
-                images.append(load_image(path))
+                logger.error(f"Cannot load {path} because it's not an image of an existing archive.")
+        elif is_archive_path(path) and os.path.isfile(path):
+            # All archive images, in member name order
+            yield from iter_archive_images(path, include, exclude)
+        elif os.path.isfile(path):
+            if is_image_path(path):
+                yield path
             else:
                 logger.error(f"Cannot load {path} because it's not a valid image type.")
         elif os.path.isdir(path):
-            images_paths = list_images_paths(path)
-            for image_path in images_paths:
-                captions.append(load_caption(image_path))
-                images.append(load_image(image_path))
+            # All directory images
+            yield from iter_images_paths(path, recursive, include, exclude)
         else:
             logger.error(f"Cannot load {path} because it does not exist.")
+
+def window_paths(images_paths: list, offset: int = 0, limit: int = 0):
+    if limit > 0:
+        return images_paths[offset:offset+limit]
+    return images_paths[offset:]
+
+def load_image_cached(path: str, cache: str = "none", max_side: int = 0):
+    if cache == "none":
+        return load_image(path, max_side=max_side)
+    # Every max_side is cached apart
+    return image_cache.load(path, partial(load_image, max_side=max_side), disk=(cache == "memory+disk"), 
+                            variant=f"@{max_side}" if max_side > 0 else "")
+
+def load_images(images_paths: list, workers: int = 1, cache: str = "none", max_side: int = 0):
+    # PIL releases the GIL while decoding so threads overlap I/O and decode
+    return list(imap_ordered(partial(load_image_cached, cache=cache, max_side=max_side), images_paths, workers))
+
+def load_image_into(job: tuple, cache: str = "none", max_side: int = 0):
+    path, out = job
+    if cache == "none":
+        return load_image(path, out=out, max_side=max_side)
+    return out.copy_(load_image_cached(path, cache, max_side)[0])
+
+def load_images_batches(images_paths: list, workers: int = 1, cache: str = "none", max_side: int = 0):
+    # Groups same size images into preallocated [N,H,W,3] batches, also returns
+    # the indexes of images_paths in the order they are in the batches
+    groups = dict()
+    for index, size in enumerate(imap_ordered(partial(probe_image_size, max_side=max_side), images_paths, workers)):
+        groups.setdefault(size, []).append(index)
+    batches = list()
+    order = list()
+    for (width, height), indexes in groups.items():
+        batch = torch.empty((len(indexes), height, width, 3), dtype=torch.float32)
+        jobs = [(images_paths[index], batch[i]) for i, index in enumerate(indexes)]
+        for _ in imap_ordered(partial(load_image_into, cache=cache, max_side=max_side), jobs, workers):
+            pass
+        batches.append(batch)
+        order += indexes
+    return batches, order
+
+def load_images_with_captions(images_paths: list, workers: int = 1, cache: str = "none", max_side: int = 0):
+    images = load_images(images_paths, workers, cache, max_side)
+    with metrics.timer("load.captions"):
+        captions = read_images_captions(images_paths, workers)
     return images, captions
 
-def save_image(path, image_type, image: Image, exif_data=None, quality=100, optimize=True):
+def save_image(path, image_type, image: Image, exif_data=None, quality=100, optimize=True, exif_bytes=None):
+    # EXIF is embedded while encoding, PNG metadata goes in exif_data as PngInfo
     if image_type == 'JPEG':
-        image.save(path, image_type, quality=quality, optimize=optimize, dpi=image.info.get('dpi'))
+        image.save(path, image_type, quality=quality, optimize=optimize, dpi=image.info.get('dpi', (0, 0)), exif=exif_bytes or b"")
     elif image_type == 'WebP':
-        image.save(path, image_type, quality=quality, lossless=True, exif=exif_data)
+        image.save(path, image_type, quality=quality, lossless=True, exif=exif_bytes or b"")
     elif image_type == 'PNG':
         image.save(path, image_type, pnginfo=exif_data, optimize=optimize)
     elif image_type == 'BMP':
         image.save(path, image_type)
     elif image_type == 'TIFF':
-        image.save(path, image_type, quality=quality, optimize=optimize)
+        image.save(path, image_type, quality=quality, optimize=optimize, exif=exif_bytes or b"")
     else:
         image.save(path, image_type, pnginfo=exif_data, optimize=optimize)
 
-def extract_metadata(prompt_data, extra_pnginfo, img, file_type, positive_prompt=None, negative_prompt=None):
-    metadata = None
-    exif_bytes = None
-    checkpoint = None
-    steps = None
-    sampler = None
-    seed = None
-    cfg = None
-    positive = None
-    negative = None
-    embeddings = None
-    loras = None
-    text = {}
-    # logger.info(f"prompt = {prompt_data}")
-    for key in prompt_data.keys():
-        node = prompt_data[key]
-        if "inputs" in node.keys():
-            for input_key in node["inputs"].keys():
-                input = node["inputs"][input_key]
-                if "text" == input_key:
-                    if isinstance(input, list): 
-                        id = input[0]
-                        if id in text.keys():
-                            text[key] = text[id]
-                    else:
-                        text[key] = input
-    # logger.info(f"{text}")
-    for key in prompt_data.keys():
-        node = prompt_data[key]
-        # logger.info(f"node {key} = {node}")
-        if "inputs" in node.keys():
-            for input_key in node["inputs"].keys():
-                input = node["inputs"][input_key]
-                try:
-                    if "base_ckpt_name" in input_key and input != "None":
-                        checkpoint = os.path.join(get_comfy_dir("models/checkpoints"), input)
-                    if "steps" == input_key:
-                        steps = input
-                    if "seed" == input_key:
-                        seed = input
-                    if "cfg" == input_key:
-                        cfg = input
-                    if "sampler_name" == input_key:
-                        sampler = CIVITAI_SAMPLER_MAP.get(input.replace("_gpu", "").replace("_cfg_pp", ""), None)
-                    if "positive" == input_key and not positive_prompt:
-                        # Check potential positive 
-                        if isinstance(input, list): 
-                            id = input[0]
-                            if id in text.keys():
-                                positive = text[id]
-                    if "negative" == input_key and not negative_prompt:
-                        # Check potential negative 
+def write_image(path, image_type, image: Image, metadata=None, exif_bytes=None):
+    # Encode and write, runs on the Save_Images worker threads.
+    # The claimed empty file is only replaced once the image is complete
+    temp_path = f"{path}.tmp"
+    try:
+        with metrics.timer("save.encode"):
+            save_image(temp_path, image_type, image, exif_data=metadata, exif_bytes=exif_bytes)
+        os.replace(temp_path, path)
+        if metrics.enabled:
+            metrics.count("bytes_written", os.path.getsize(path))
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        filename_allocator.release(path)
+        raise
+    return path
+
+def encode_image(image_type, image: Image, metadata=None, exif_bytes=None):
+    # Encodes in memory for the shards, runs on the Save_Images worker threads
+    buffer = BytesIO()
+    with metrics.timer("save.encode"):
+        save_image(buffer, image_type, image, exif_data=metadata, exif_bytes=exif_bytes)
+    return buffer.getvalue()
+
+def write_samples(samples: list, pbar=None):
+    # samples are (writer, members, image ext, encoding future), appended to the shards in order
+    paths = list()
+    with metrics.timer("save.write_shards"):
+        for k, (writer, members, ext, future) in enumerate(samples):
+            members = {ext: future.result(), **members}
+            if metrics.enabled:
+                metrics.count("bytes_written", sum(len(data) for data in members.values()))
+            paths.append(writer.write(members)[ext])
+            if pbar is not None:
+                pbar.update_absolute(k+1, len(samples))
+        for writer in dict.fromkeys(writer for writer, _, _, _ in samples):
+            writer.flush()
+    return paths
+
+def log_write_error(future):
+    if future.exception() is not None:
+        logger.error(f"Cannot save image in background: {future.exception()}")
+
+"""
+Everything the metadata of the saved images takes from the prompt graph: prompts text,
+sampler parameters, model and LoRA hashes and the serialized workflow.
+Built once per prompt, every image only adds its own size
+"""
+class MetadataContext:
+    def __init__(self, prompt_data, extra_pnginfo):
+        self.prompt_data = prompt_data
+        self.extra_pnginfo = extra_pnginfo
+        self.checkpoint = None
+        self.steps = None
+        self.sampler = None
+        self.seed = None
+        self.cfg = None
+        self.positive = None
+        self.negative = None
+        self.__parameters = {}
+        self.__modelhash = None
+        self.__parse(prompt_data or {})
+        self.prompt_json = json.dumps(prompt_data) if prompt_data is not None else None
+        self.extra_pnginfo_json = {x: json.dumps(extra_pnginfo[x]) for x in extra_pnginfo} if extra_pnginfo is not None else {}
+
+    def modelhash(self):
+        if self.__modelhash is None:
+            with metrics.timer("metadata.sha256"):
+                self.__modelhash = get_sha256(self.checkpoint)[:10] if self.checkpoint else ""
+        return self.__modelhash
+
+    def parameters(self, positive_prompt=None, negative_prompt=None):
+        # A1111 parameters split around the image size, memoized per prompts
+        key = (positive_prompt, negative_prompt)
+        if key not in self.__parameters:
+            self.__parameters[key] = self.__build_parameters(positive_prompt, negative_prompt)
+        return self.__parameters[key]
+
+    def a111_parameters(self, width, height, positive_prompt=None, negative_prompt=None):
+        head, tail = self.parameters(positive_prompt, negative_prompt)
+        return f"{head}Size: {width}x{height}{tail}"
+
+    def image_metadata(self, width, height, file_type, positive_prompt=None, negative_prompt=None):
+        metadata = None
+        exif_bytes = None
+        a111_params = self.a111_parameters(width, height, positive_prompt, negative_prompt)
+        if file_type == 'PNG':
+            metadata = PngImagePlugin.PngInfo()
+            metadata.add_text("parameters", a111_params)
+            if self.prompt_json is not None:
+                metadata.add_text("prompt", self.prompt_json)
+            for x, extra_json in self.extra_pnginfo_json.items():
+                metadata.add_text(x, extra_json)
+        else:
+            with metrics.timer("metadata.exif"):
+                exif_bytes = piexif.dump({
+                    "Exif": {
+                        piexif.ExifIFD.UserComment: piexif_helper.UserComment.dump(a111_params, encoding="unicode")
+                    },
+                })
+        return metadata, exif_bytes
+
+    # Private API
+    def __parse(self, prompt_data):
+        text = {}
+        for key in prompt_data.keys():
+            node = prompt_data[key]
+            if "inputs" in node.keys():
+                for input_key in node["inputs"].keys():
+                    input = node["inputs"][input_key]
+                    if "text" == input_key:
                         if isinstance(input, list): 
                             id = input[0]
                             if id in text.keys():
-                                negative = text[id]
-                except Exception as e:
-                    logger.error(f"Don't know what to do with metadata {input}: {e}", e)
-    if positive_prompt:
-        positive = positive_prompt
-    if negative_prompt:
-        negative = negative_prompt
-    if positive:
-        negative = negative if negative else ""
-        try:
-            metadata_extractor = PromptMetadataExtractor([positive, negative])
-            embeddings = metadata_extractor.get_embeddings()
-            loras = metadata_extractor.get_loras()
-        except Exception as e:
-            logger.error(f"Error during metadata extraction: {e}", e)
-    else:
-        positive = ""
-        negative = ""
+                                text[key] = text[id]
+                        else:
+                            text[key] = input
+        for key in prompt_data.keys():
+            node = prompt_data[key]
+            if "inputs" in node.keys():
+                for input_key in node["inputs"].keys():
+                    input = node["inputs"][input_key]
+                    try:
+                        if "base_ckpt_name" in input_key and input != "None":
+                            self.checkpoint = os.path.join(get_comfy_dir("models/checkpoints"), input)
+                        if "steps" == input_key:
+                            self.steps = input
+                        if "seed" == input_key:
+                            self.seed = input
+                        if "cfg" == input_key:
+                            self.cfg = input
+                        if "sampler_name" == input_key:
+                            self.sampler = CIVITAI_SAMPLER_MAP.get(input.replace("_gpu", "").replace("_cfg_pp", ""), None)
+                        if "positive" == input_key:
+                            # Check potential positive 
+                            if isinstance(input, list): 
+                                id = input[0]
+                                if id in text.keys():
+                                    self.positive = text[id]
+                        if "negative" == input_key:
+                            # Check potential negative 
+                            if isinstance(input, list): 
+                                id = input[0]
+                                if id in text.keys():
+                                    self.negative = text[id]
+                    except Exception as e:
+                        logger.error(f"Don't know what to do with metadata {input}: {e}")
+
+    def __build_parameters(self, positive_prompt, negative_prompt):
+        positive = positive_prompt if positive_prompt else self.positive
+        negative = negative_prompt if negative_prompt else self.negative
         embeddings = {}
         loras = {}
-    # Save the metadata
-    logger.info({
-        "checkpoint": checkpoint,
-        "steps": steps,
-        "sampler": sampler,
-        "seed": seed,
-        "cfg": cfg,
-        "positive": positive,
-        "negative": negative,
-        "embeddings": embeddings,
-        "loras": loras
-    })
-    if checkpoint:
-        modelhash = get_sha256(checkpoint)[:10]
-    else:
-        modelhash = ""
-    extension_hashes = json.dumps(embeddings | loras | { "model": modelhash })
-    basemodelname = parse_checkpoint_name_without_extension(checkpoint) if checkpoint else None
-    positive_a111_params = handle_whitespace(positive)
-    negative_a111_params = f"\nNegative prompt: {handle_whitespace(negative)}"
-    width = img.width
-    height = img.height
-    step_str = f"Steps: {steps}" if steps else ""
-    sampler_str = f"Sampler: {sampler}" if sampler else ""
-    cfg_str = f"CFG scale: {cfg}" if cfg else ""
-    seed_str = f"Seed: {seed}" if seed else ""
-    size_str = f"Size: {width}x{height}"
-    all_str = " ,".join([step_str, sampler_str, cfg_str, seed_str, size_str])
-    a111_params = f"{positive_a111_params}{negative_a111_params}\n{all_str}, Model hash: {modelhash}, Model: {basemodelname}, Hashes: {extension_hashes}, Version: ComfyUI"
-    if file_type == 'PNG':
-        metadata = PngInfo()
-        metadata.add_text("parameters", a111_params)
-        if prompt_data is not None:
-            metadata.add_text("prompt", json.dumps(prompt_data))
-        if extra_pnginfo is not None:
-            for x in extra_pnginfo:
-                metadata.add_text(x, json.dumps(extra_pnginfo[x]))
-    else:
-        exif_bytes = piexif.dump({
-            "Exif": {
-                piexif.ExifIFD.UserComment: piexif.helper.UserComment.dump(a111_params, encoding="unicode")
-            },
+        if positive:
+            negative = negative if negative else ""
+            try:
+                with metrics.timer("metadata.loras_embeddings"):
+                    metadata_extractor = PromptMetadataExtractor([positive, negative])
+                embeddings = metadata_extractor.get_embeddings()
+                loras = metadata_extractor.get_loras()
+            except Exception as e:
+                logger.error(f"Error during metadata extraction: {e}")
+        else:
+            positive = ""
+            negative = ""
+        # Save the metadata
+        logger.info({
+            "checkpoint": self.checkpoint,
+            "steps": self.steps,
+            "sampler": self.sampler,
+            "seed": self.seed,
+            "cfg": self.cfg,
+            "positive": positive,
+            "negative": negative,
+            "embeddings": embeddings,
+            "loras": loras
         })
-    return metadata, exif_bytes
+        modelhash = self.modelhash()
+        extension_hashes = json.dumps(embeddings | loras | { "model": modelhash })
+        basemodelname = parse_checkpoint_name_without_extension(self.checkpoint) if self.checkpoint else None
+        positive_a111_params = handle_whitespace(positive)
+        negative_a111_params = f"\nNegative prompt: {handle_whitespace(negative)}"
+        step_str = f"Steps: {self.steps}" if self.steps else ""
+        sampler_str = f"Sampler: {self.sampler}" if self.sampler else ""
+        cfg_str = f"CFG scale: {self.cfg}" if self.cfg else ""
+        seed_str = f"Seed: {self.seed}" if self.seed else ""
+        all_str = " ,".join([step_str, sampler_str, cfg_str, seed_str, ""])
+        head = f"{positive_a111_params}{negative_a111_params}\n{all_str}"
+        tail = f", Model hash: {modelhash}, Model: {basemodelname}, Hashes: {extension_hashes}, Version: ComfyUI"
+        return head, tail
+
+
+# Contexts of the last prompts, the prompt dict of an execution is the same object for all its nodes
+METADATA_CONTEXTS_SIZE = 4
+metadata_contexts = OrderedDict()
+
+def metadata_context(prompt_data, extra_pnginfo):
+    key = (id(prompt_data), id(extra_pnginfo))
+    context = metadata_contexts.get(key)
+    # Same ids could be reused by new objects once the old ones are gone
+    if context is None or context.prompt_data is not prompt_data or context.extra_pnginfo is not extra_pnginfo:
+        context = MetadataContext(prompt_data, extra_pnginfo)
+        metadata_contexts[key] = context
+        while len(metadata_contexts) > METADATA_CONTEXTS_SIZE:
+            metadata_contexts.popitem(last=False)
+    metadata_contexts.move_to_end(key)
+    return context
+
+def extract_metadata(prompt_data, extra_pnginfo, img, file_type, positive_prompt=None, negative_prompt=None):
+    context = metadata_context(prompt_data, extra_pnginfo)
+    return context.image_metadata(img.width, img.height, file_type, positive_prompt=positive_prompt, negative_prompt=negative_prompt)
+
+
+def converted_image_path(image_path: str, output_directory: str, convert_to: str):
+    image_name = pathlib.Path(image_path).stem
+    return f"{os.path.join(output_directory, image_name)}{CONVERT_TO_TYPES_EXT[convert_to]}"
+
+def convert_image(image_path: str, output_directory: str, convert_to: str, max_side: int = 0):
+    # Top-level so it can be pickled to the conversion worker processes
+    save_path = converted_image_path(image_path, output_directory, convert_to)
+    try:
+        # Only measured when converting in process, the workers have their own metrics
+        with metrics.timer("convert.image"), Image.open(image_path) as image:
+            image = reduce_image(image, max_side)
+            # Resize to 256px square for ICO
+            if convert_to == "ICO":
+                image = image.resize((256, 256), Image.LANCZOS)
+            save_image(save_path, convert_to, image)
+        return save_path, None
+    except Exception as e:
+        return None, str(e)
+
+def convert_images(jobs, convert_to: str, workers: int = 1, max_side: int = 0):
+    # jobs yields (image_path, output_directory), they are read lazily. Yields
+    # (image_path, (save_path, error)) in the same order as the jobs
+    jobs = iter(jobs)
+    if workers <= 1:
+        for image_path, output_directory in jobs:
+            yield image_path, convert_image(image_path, output_directory, convert_to, max_side)
+        return
+    pending = deque()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for image_path, output_directory in jobs:
+                job = [image_path, output_directory, None]
+                pending.append(job)
+                job[2] = executor.submit(convert_image, image_path, output_directory, convert_to, max_side)
+                if len(pending) >= workers * 4:
+                    result = pending[0][2].result()
+                    yield pending.popleft()[0], result
+            while pending:
+                result = pending[0][2].result()
+                yield pending.popleft()[0], result
+    except BrokenProcessPool as e:
+        # Workers can die if this module is not importable from a spawned process
+        logger.warning(f"Conversion workers stopped ({e}), converting the remaining images in process")
+        for image_path, output_directory, _ in pending:
+            yield image_path, convert_image(image_path, output_directory, convert_to, max_side)
+        for image_path, output_directory in jobs:
+            yield image_path, convert_image(image_path, output_directory, convert_to, max_side)
 
 
 ################################ Coverter Nodes
@@ -279,10 +464,18 @@ class D00MYsImagesConverter:
                 "output_directory": ("STRING", {"default": "X://path/to/output"}),
                 "convert_to":  (CONVERT_TO_TYPES, ),
             },
+            "optional": {
+                "workers": ("INT", {"default": 1, "min": 0, "max": 256, "tooltip": "Conversion processes, 0 uses every CPU core."}),
+                "recursive": ("BOOLEAN", {"default": False, "tooltip": "Also convert the subdirectories, their structure is kept in the output."}),
+                "include": ("STRING", {"default": "", "tooltip": "Comma separated glob patterns of the images to convert, e.g. *.png, photos/*"}),
+                "exclude": ("STRING", {"default": "", "tooltip": "Comma separated glob patterns of the images to skip."}),
+                "skip_unchanged": ("BOOLEAN", {"default": False, "tooltip": "Only convert the images that are new or changed since they were last converted."}),
+                "max_side": ("INT", {"default": 0, "min": 0, "max": 16384, "tooltip": "Downscale the images whose longest side is bigger while decoding, 0 keeps their size."}),
+            },
         }
     
-    RETURN_TYPES = ("STRING", "STRING", "INT")
-    RETURN_NAMES = ("Loaded Images Paths", "Converted Paths", "Total Converted")
+    RETURN_TYPES = ("STRING", "STRING", "INT", "STRING", "INT", "INT")
+    RETURN_NAMES = ("Loaded Images Paths", "Converted Paths", "Total Converted", "Failed Images", "Total Skipped", "Total Failed")
     FUNCTION = "convert_images"
     CATEGORY = CATEGORY_STRING
 
@@ -292,33 +485,71 @@ class D00MYsImagesConverter:
             return True
         return validate_load_images(directory)
 
-    def convert_images(self, directory: str, output_directory: str, convert_to: str, **kwargs):
+    @metrics.node("Images_Converter")
+    def convert_images(self, directory: str, output_directory: str, convert_to: str, workers: int = 1, recursive: bool = False, 
+                       include: str = "", exclude: str = "", skip_unchanged: bool = False, max_side: int = 0, **kwargs):
+        images_paths = list()
         converted_images_paths = list()
-        images_paths = list_images_paths(directory)
-        images_total = len(images_paths)
+        failed_images = list()
+        skipped_images_paths = list()
+        workers = workers if workers > 0 else (os.cpu_count() or 1)
         pathlib.Path(output_directory).mkdir(parents=True, exist_ok=True)
-        pbar = ProgressBar(images_total)
-        logger.debug(f"Images to convert: {images_total}")
-        for k, image_path in enumerate(images_paths):
+        manifest = ConversionManifest(output_directory)
+        pbar = ProgressBar(0)
+        listed_paths = SimpleQueue()
+        stop_listing = threading.Event()
+
+        def list_images():
+            # Lists ahead of the conversions on its own thread so the progress total is
+            # known early, conversions only start behind it. None marks the end
             try:
-                image_name = pathlib.Path(image_path).stem
-                image = Image.open(image_path)
-                ext = CONVERT_TO_TYPES_EXT[convert_to]
-                save_path = f"{os.path.join(output_directory, image_name)}{ext}"
-                logger.debug(f"Saving: {save_path}")
-                # Resize to 256px square for ICO
-                if convert_to == "ICO":
-                    image = image.resize((256, 256), Image.ANTIALIAS)
-                save_image(save_path, convert_to, image)
-                converted_images_paths.append(save_path)
-                image.close()
-            except Exception as e:
-                logger.error(f"An error occured during the convertion of image {image_path}: {e}")
-            pbar.update_absolute(k, images_total)
-        if pbar is not None:
-            pbar.update_absolute(images_total, images_total)
-        logger.info(f"Finished converting {images_total} images to PNG")
-        return ("\n".join(images_paths), "\n".join(converted_images_paths), images_total)
+                # The output directory can be inside directory, its conversions are not converted again
+                for image_path in iter_images_paths(directory, recursive, include, exclude, skip_directories=[output_directory]):
+                    if stop_listing.is_set():
+                        break
+                    images_paths.append(image_path)
+                    listed_paths.put(image_path)
+            finally:
+                listed_paths.put(None)
+
+        def jobs():
+            output_directories = set()
+            while (image_path := listed_paths.get()) is not None:
+                relative_dir = os.path.relpath(os.path.dirname(image_path), directory)
+                image_output_directory = output_directory if relative_dir == "." else os.path.join(output_directory, relative_dir)
+                if skip_unchanged and manifest.is_unchanged(image_path, converted_image_path(image_path, image_output_directory, convert_to), convert_to, max_side):
+                    skipped_images_paths.append(image_path)
+                    continue
+                if image_output_directory not in output_directories:
+                    os.makedirs(image_output_directory, exist_ok=True)
+                    output_directories.add(image_output_directory)
+                yield image_path, image_output_directory
+
+        logger.debug(f"Converting images of {directory} with {workers} workers")
+        lister = threading.Thread(target=list_images, name="D00MYs images listing", daemon=True)
+        lister.start()
+        try:
+            for image_path, (save_path, error) in convert_images(jobs(), convert_to, workers, max_side):
+                if error is None:
+                    logger.debug(f"Saved: {save_path}")
+                    converted_images_paths.append(save_path)
+                    manifest.add(image_path, save_path, convert_to, max_side)
+                else:
+                    logger.error(f"An error occured during the convertion of image {image_path}: {error}")
+                    failed_images.append(f"{image_path}: {error}")
+                # The total grows until the listing is done
+                pbar.update_absolute(len(converted_images_paths) + len(failed_images) + len(skipped_images_paths), len(images_paths))
+        finally:
+            stop_listing.set()
+            manifest.save()
+        lister.join()
+        pbar.update_absolute(len(images_paths), len(images_paths))
+        metrics.count("images", len(converted_images_paths))
+        metrics.count("skipped", len(skipped_images_paths))
+        metrics.count("failed", len(failed_images))
+        logger.info(f"Finished converting images to {convert_to}: {len(converted_images_paths)} converted, {len(skipped_images_paths)} unchanged, {len(failed_images)} failed")
+        return ("\n".join(images_paths), "\n".join(converted_images_paths), len(converted_images_paths), "\n".join(failed_images), 
+                len(skipped_images_paths), len(failed_images))
 
 
 ################################ Text Nodes
@@ -405,6 +636,8 @@ class D00MYsSaveText:
             },
             "optional": {
                 "images_paths": ("STRING", {"default": ""}),
+                "output_mode": (SAVE_OUTPUT_MODES, {"default": "files", "tooltip": "One .txt file per text, or .tar shards of the texts in the output folder."}),
+                "shard_size_mb": ("INT", {"default": DEFAULT_SHARD_SIZE_MB, "min": 1, "max": 1024 * 1024, "tooltip": "A new shard is started once this size is reached."}),
             }
         }
 
@@ -416,8 +649,12 @@ class D00MYsSaveText:
     FUNCTION = "save_file"
     CATEGORY = CATEGORY_STRING
 
-    def save_file(self, text: list, filename_prefix: list, images_paths: list, **kwargs):
+    @metrics.node("Save_Text")
+    def save_file(self, text: list, filename_prefix: list, images_paths: list = [""], output_mode: list = ["files"], 
+                  shard_size_mb: list = [DEFAULT_SHARD_SIZE_MB], **kwargs):
         filename_prefix = filename_prefix[0]
+        if output_mode[0] == "shards":
+            return (self.save_shards(text, filename_prefix, images_paths, shard_size_mb[0]),)
         path = None
         if len(images_paths) == 1:
             image_path = images_paths[0]
@@ -431,11 +668,8 @@ class D00MYsSaveText:
                 image_dir = str(image_path_obj.parent)
                 path = os.path.join(image_dir, f"{image_name}.txt")
             else:
-                index = 1
-                path = os.path.join(get_comfy_dir("output"), f"{filename_prefix}_{str(index).zfill(5)}_.txt")
-                while os.path.exists(path):
-                    index = index + 1
-                    path = os.path.join(get_comfy_dir("output"), f"{filename_prefix}_{str(index).zfill(5)}_.txt")
+                output_dir = os.path.join(get_comfy_dir("output"), os.path.dirname(filename_prefix))
+                path = filename_allocator.claim(output_dir, os.path.basename(filename_prefix), "_.txt")
             if path:
                 with open(path, "w+", encoding="UTF-8") as fp:
                     fp.write(text)
@@ -454,6 +688,21 @@ class D00MYsSaveText:
             logger.error(f"Text length must be the same as image paths or there must be only one image path. Got {len(images_paths)}.")
         return (path,)
 
+    def save_shards(self, text: list, filename_prefix: str, images_paths: list, shard_size_mb: int):
+        # Every text is a sample of its own, with the path of its image when there is one per text
+        output_dir = os.path.join(get_comfy_dir("output"), os.path.dirname(filename_prefix))
+        writer = get_shard_writer(output_dir, os.path.basename(filename_prefix), shard_size_mb * 1024 * 1024)
+        path = None
+        with metrics.timer("save_text.write_shards"):
+            for index, text_to_save in enumerate(text):
+                members = {"txt": text_to_save.encode("UTF-8")}
+                if len(images_paths) == len(text) and images_paths[index]:
+                    members["json"] = json.dumps({"image": images_paths[index]}).encode("UTF-8")
+                path = writer.write(members)["txt"]
+            writer.flush()
+        logger.info(f"Saved {len(text)} texts in {writer.shard_path}")
+        return path
+
 
 ################################ Images Nodes
 
@@ -474,6 +723,11 @@ class D00MYsSaveImage:
             "optional": {
                 "opt_positive_prompt": ("STRING", {"default": ""}),
                 "opt_negative_prompt": ("STRING", {"default": ""}),
+                "save_workers": ("INT", {"default": 4, "min": 1, "max": 64, "tooltip": "Threads encoding and writing the files."}),
+                "background_flush": ("BOOLEAN", {"default": False, "tooltip": "Return before the files are written, errors are only logged. Not used with shards."}),
+                "output_mode": (SAVE_OUTPUT_MODES, {"default": "files", "tooltip": "One file per image, or .tar shards holding the images with their caption and metadata."}),
+                "shard_size_mb": ("INT", {"default": DEFAULT_SHARD_SIZE_MB, "min": 1, "max": 1024 * 1024, "tooltip": "A new shard is started once this size is reached."}),
+                "captions": ("STRING", {"forceInput": True, "tooltip": "Captions of the images, stored next to them in the shards."}),
             },
             "hidden": {"prompt": "PROMPT", "extra_pnginfo": "EXTRA_PNGINFO"},
         }
@@ -486,60 +740,133 @@ class D00MYsSaveImage:
     OUTPUT_IS_LIST = (True,)
     CATEGORY = CATEGORY_STRING
 
+    @metrics.node("Save_Images")
     def save_image(self, images: list, filename_prefix: list, file_type: list, save_metadata: list, opt_positive_prompt: list, 
-                   opt_negative_prompt: list, prompt, extra_pnginfo, **kwargs):
+                   opt_negative_prompt: list, prompt, extra_pnginfo, save_workers: list = [4], background_flush: list = [False], 
+                   output_mode: list = ["files"], shard_size_mb: list = [DEFAULT_SHARD_SIZE_MB], captions: list = [], **kwargs):
         filename_prefix = filename_prefix[0]
         file_type = file_type[0]
         save_metadata = save_metadata[0]
+        save_workers = save_workers[0]
+        background_flush = background_flush[0]
+        shards = output_mode[0] == "shards"
         results = list()
         results_paths = list()
-        pbar = ProgressBar(len(images))
-        for index, image in enumerate(images):
-            try:
-                positive_prompt = opt_positive_prompt[index] if index < len(opt_positive_prompt) else None
-                negative_prompt = opt_negative_prompt[index] if index < len(opt_negative_prompt) else None
-                if index > 0 and not positive_prompt and len(opt_positive_prompt) > 0:
-                    positive_prompt = opt_positive_prompt[0]
-                if index > 0 and not negative_prompt and len(opt_negative_prompt) > 0:
-                    negative_prompt = opt_negative_prompt[0]
-                img = tensor2pil(image)
-                full_output_folder, filename, counter, subfolder, prefix = folder_paths.get_save_image_path(filename_prefix, get_comfy_dir("output"), 
-                                                                                                            image.shape[1], image.shape[0])
-                num = counter+index
-                image_file_name = os.path.join(full_output_folder, f"{filename}_{str(num).zfill(5)}.png")
-                while os.path.exists(image_file_name):  # Iterates until find a file number that does not exists
-                    num = num+1
-                    image_file_name = os.path.join(full_output_folder, f"{filename}_{str(num).zfill(5)}.png")
-                logger.info(f"Saving {image_file_name}")
-                # Resize to 256px square for ICO
-                if file_type == "ICO":
-                    img = img.resize((256, 256), Image.ANTIALIAS)
-                metadata = None
-                exif_bytes = None
-                # Extract the metadata
-                if save_metadata:
-                    try:
-                        metadata, exif_bytes = extract_metadata(prompt[0], extra_pnginfo[0], img, file_type, positive_prompt=positive_prompt, negative_prompt=negative_prompt)
-                    except Exception as e:
-                        logger.error(f"Cannot save image metadata: {e}", e)
-                save_image(image_file_name, file_type, img, exif_data=metadata)
-                if exif_bytes:
-                    piexif.insert(exif_bytes, image_file_name)
-                results.append({
-                    "filename": os.path.basename(image_file_name),
-                    "subfolder": subfolder,
-                    "type": self.type
-                })
-                results_paths.append(image_file_name)
-            except Exception as e:
-                logger.error(f"Cannot save image {image_file_name}: {e}")
-                raise e
-            pbar.update_absolute(index+1, len(images))
-        if pbar is not None:
-            pbar.update_absolute(len(images), len(images))
+        futures = list()
+        samples = list()
+        images_total = sum(len(batch) for batch in images)
+        pbar = ProgressBar(images_total)
+        index = 0
+        # Resolved once per call, or once per size when the prefix has %width% or %height%
+        save_prefixes = dict()
+        # Conversions, names and metadata are done here, encoding and writing on the workers
+        executor = ThreadPoolExecutor(max_workers=save_workers)
+        try:
+            for batch in images:
+                # One uint8 conversion per batch, images are views of it
+                with metrics.timer("save.to_numpy"):
+                    arrays = tensor2numpy(batch)
+                if arrays.ndim == 3:
+                    arrays = arrays[None]
+                size_key = (arrays.shape[2], arrays.shape[1]) if "%width%" in filename_prefix or "%height%" in filename_prefix else None
+                if size_key not in save_prefixes:
+                    save_prefixes[size_key] = resolve_save_prefix(filename_prefix, get_comfy_dir("output"), arrays.shape[2], arrays.shape[1])
+                full_output_folder, filename, subfolder = save_prefixes[size_key]
+                if shards:
+                    writer = get_shard_writer(full_output_folder, filename, shard_size_mb[0] * 1024 * 1024)
+                for array in arrays:
+                    positive_prompt = opt_positive_prompt[index] if index < len(opt_positive_prompt) else None
+                    negative_prompt = opt_negative_prompt[index] if index < len(opt_negative_prompt) else None
+                    if index > 0 and not positive_prompt and len(opt_positive_prompt) > 0:
+                        positive_prompt = opt_positive_prompt[0]
+                    if index > 0 and not negative_prompt and len(opt_negative_prompt) > 0:
+                        negative_prompt = opt_negative_prompt[0]
+                    with metrics.timer("save.to_pil"):
+                        img = numpy2pil(array)
+                    # Resize to 256px square for ICO
+                    if file_type == "ICO":
+                        img = img.resize((256, 256), Image.LANCZOS)
+                    metadata = None
+                    exif_bytes = None
+                    members = dict()
+                    # Extract the metadata
+                    if save_metadata:
+                        try:
+                            with metrics.timer("save.metadata"):
+                                metadata, exif_bytes = extract_metadata(prompt[0], extra_pnginfo[0], img, file_type, positive_prompt=positive_prompt, negative_prompt=negative_prompt)
+                                if shards:
+                                    parameters = metadata_context(prompt[0], extra_pnginfo[0]).a111_parameters(img.width, img.height, positive_prompt, negative_prompt)
+                                    members["json"] = json.dumps({"parameters": parameters, "width": img.width, "height": img.height}).encode("UTF-8")
+                        except Exception as e:
+                            logger.error(f"Cannot save image metadata: {e}", e)
+                    if shards:
+                        # Encoded on the workers, appended to the shard in order once encoded
+                        if index < len(captions):
+                            members["txt"] = captions[index].encode("UTF-8")
+                        samples.append((writer, members, CONVERT_TO_TYPES_EXT[file_type][1:], executor.submit(encode_image, file_type, img, metadata, exif_bytes)))
+                        index += 1
+                        continue
+                    with metrics.timer("save.claim_name"):
+                        image_file_name = filename_allocator.claim(full_output_folder, filename, CONVERT_TO_TYPES_EXT[file_type])
+                    logger.info(f"Saving {image_file_name}")
+                    futures.append(executor.submit(write_image, image_file_name, file_type, img, metadata, exif_bytes))
+                    results.append({
+                        "filename": os.path.basename(image_file_name),
+                        "subfolder": subfolder,
+                        "type": self.type
+                    })
+                    results_paths.append(image_file_name)
+                    index += 1
+        finally:
+            # Queued writes keep going after shutdown
+            executor.shutdown(wait=False)
+        metrics.count("images", images_total)
+        if shards:
+            # Shards are only written in order, background_flush does not apply
+            return {"ui": {"images": []}, "result": (write_samples(samples, pbar),)}
+        if background_flush:
+            for future in futures:
+                future.add_done_callback(log_write_error)
+            pbar.update_absolute(images_total, images_total)
+        else:
+            for k, future in enumerate(futures):
+                try:
+                    with metrics.timer("save.wait_writes"):
+                        future.result()
+                except Exception as e:
+                    logger.error(f"Cannot save image {results_paths[k]}: {e}")
+                    raise e
+                pbar.update_absolute(k+1, images_total)
         return {"ui": {"images": results}, "result": (results_paths,)}
 
 
+def parse_weights(weights: str):
+    # Comma or newline separated numbers, one per image, at least one of them above zero
+    values = [value.strip() for value in weights.replace("\n", ",").split(",") if value.strip()]
+    parsed = list()
+    for value in values:
+        try:
+            weight = float(value)
+        except ValueError:
+            raise ValueError(f"Random_Images weights must be numbers, got '{value}'") from None
+        if not math.isfinite(weight) or weight < 0:
+            raise ValueError(f"Random_Images weights must be positive or zero, got '{value}'")
+        parsed.append(weight)
+    if parsed and not any(parsed):
+        raise ValueError("Random_Images weights are all zero, no image can be picked")
+    return parsed
+
+def sample_indices(rng: random.Random, total: int, count: int, replacement: bool, weights: list = None):
+    # Indices only, the images are gathered afterwards
+    if replacement:
+        return rng.choices(range(total), weights=weights, k=count)
+    if weights is None:
+        return rng.sample(range(total), min(count, total))
+    # Weighted sampling without replacement (Efraimidis-Spirakis), zero weights are never picked
+    keys = [(rng.random() ** (1 / weight), index) for index, weight in enumerate(weights) if weight > 0]
+    return [index for _, index in sorted(keys, reverse=True)[:count]]
+
+
 class D00MYsRandomImages:
     def __init__(self):
         self.type = "output"
@@ -554,12 +881,16 @@ class D00MYsRandomImages:
             },
             "optional": {
                 "captions": ("STRING", {"default": ""}),
+                "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff, "control_after_generate": True, "tooltip": "Same seed, same images."}),
+                "replacement": ("BOOLEAN", {"default": True, "tooltip": "Allow picking the same image more than once."}),
+                "weights": ("STRING", {"default": "", "multiline": True, "tooltip": "Optional comma separated weight of every image, in the order of the images."}),
             }
         }
     
     @classmethod
-    def IS_CHANGED(s, images, count, captions, **kwargs):
-        return time.time()
+    def IS_CHANGED(s, count: list = [1], seed: list = [0], replacement: list = [True], weights: list = [""], **kwargs):
+        # Only a new seed or sampling settings pick other images, new inputs are seen by ComfyUI itself
+        return f"{seed[0]}:{count[0]}:{replacement[0]}:{weights[0]}"
     
     INPUT_IS_LIST = True
     RETURN_TYPES = ("IMAGE", "STRING",)
@@ -569,25 +900,35 @@ class D00MYsRandomImages:
     OUTPUT_IS_LIST = (True, True,)
     CATEGORY = CATEGORY_STRING
 
-    def random_images(self, images: list, count: list, captions: list, **kwargs):
+    @metrics.node("Random_Images")
+    def random_images(self, images: list, count: list, captions: list = [], seed: list = [0], replacement: list = [True], weights: list = [""], **kwargs):
         count = count[0]
+        # Every image of every batch, captions are in the same order
+        rows = [(item, row) for item, batch in enumerate(images) for row in range(batch.shape[0])]
+        weights = parse_weights(weights[0]) or None
+        if weights is not None and len(weights) != len(rows):
+            raise ValueError(f"Random_Images got {len(weights)} weights for {len(rows)} images")
+        pickable = len(rows) if weights is None else sum(1 for weight in weights if weight > 0)
+        if not replacement[0] and count > pickable:
+            logger.warning(f"Cannot pick {count} different images out of {pickable}, picking all of them")
+        with metrics.timer("random.sample"):
+            indices = sample_indices(random.Random(seed[0]), len(rows), count, replacement[0], weights)
+
+        with metrics.timer("random.gather"):
+            # Views of the input batches, nothing is copied
+            results_images = [images[rows[index][0]][rows[index][1]:rows[index][1] + 1] for index in indices]
+        metrics.count("images", len(results_images))
         if len(captions) == 0:
-            result = random.choices(images, k=count)
-            return (result, [],)
-        else:
-            choices = [(image, caption) for image, caption in zip(images, captions)]
-            results = random.choices(choices, k=count)
-            results_images = list()
-            results_captions = list()
-            for image, caption in results:
-                results_images.append(image)
-                results_captions.append(caption)
-            return (results_images, results_captions,)
+            return (results_images, [],)
+        results_captions = [captions[index] if index < len(captions) else "" for index in indices]
+        return (results_images, results_captions,)
 
 
 class D00MYsLoadImagesFromPaths:
     def __init__(self):
         self.type = "output"
+        self.cursor = None
+        self.cursor_key = None
         logger.debug("Init of D00MYsLoadImagesFromPath")
 
     @classmethod
@@ -596,37 +937,131 @@ class D00MYsLoadImagesFromPaths:
             "required": {
                 "paths": ("STRING", {"default": "X://path/to/images/image.ext"}),
                 "load_captions": ("BOOLEAN", {"default": False}),
+            },
+            "optional": {
+                "offset": ("INT", {"default": 0, "min": 0, "tooltip": "Index of the first image to load."}),
+                "limit": ("INT", {"default": 0, "min": 0, "tooltip": "Maximum number of images to load, 0 loads them all."}),
+                "iterate": ("BOOLEAN", {"default": False, "tooltip": "Move the window by limit images on every execution."}),
+                "decode_threads": ("INT", {"default": 4, "min": 1, "max": 64, "tooltip": "Threads reading and decoding images."}),
+                "cache": (IMAGE_CACHE_MODES, {"default": "memory", "tooltip": "Keep decoded images in memory, and optionally on disk, until their file changes."}),
+                "output_mode": (LOAD_OUTPUT_MODES, {"default": "list", "tooltip": "batch outputs one [N,H,W,3] batch per image size instead of one item per image."}),
+                "recursive": ("BOOLEAN", {"default": False, "tooltip": "Also load the images in the subdirectories of the directories."}),
+                "include": ("STRING", {"default": "", "tooltip": "Comma separated glob patterns of the directories images to load, e.g. *.png, photos/*"}),
+                "exclude": ("STRING", {"default": "", "tooltip": "Comma separated glob patterns of the directories images to skip."}),
+                "max_side": ("INT", {"default": 0, "min": 0, "max": 16384, "tooltip": "Downscale the images whose longest side is bigger while decoding, 0 keeps their size."}),
             }
         }
     
     @classmethod
-    def IS_CHANGED(s, paths, load_captions, **kwargs):
-        return time.time()
+    def IS_CHANGED(s, paths, load_captions, offset=[0], limit=[0], iterate=[False], recursive=[False], include=[""], exclude=[""], **kwargs):
+        if iterate[0]:
+            # The window moves on every execution
+            return time.time()
+        if len(paths) == 1:
+            paths = split_paths(paths[0])
+        # Only the window that is loaded, listing stops once it is full
+        images_paths = list(islice(iter_images_from_paths(paths, recursive[0], include[0], exclude[0]), 
+                                   offset[0], offset[0]+limit[0] if limit[0] > 0 else None))
+        if load_captions[0]:
+            caption_index = CaptionIndex()
+            captions_paths = [caption_index.find(image_path) for image_path in images_paths]
+            images_paths = images_paths + [caption_path for caption_path in captions_paths if caption_path]
+        return files_fingerprint(images_paths, paths, load_captions, offset, limit, recursive, include, exclude, sorted(kwargs.items()))
     
     INPUT_IS_LIST = True
-    RETURN_TYPES = ("IMAGE", "STRING",)
-    RETURN_NAMES = ("Images", "Captions")
+    RETURN_TYPES = ("IMAGE", "STRING", "INT",)
+    RETURN_NAMES = ("Images", "Captions", "Next Offset",)
     FUNCTION = "load_images"
     OUTPUT_NODE = True
-    OUTPUT_IS_LIST = (True, True,)
+    OUTPUT_IS_LIST = (True, True, False,)
     CATEGORY = CATEGORY_STRING
 
-    def load_images(self, paths: list, load_captions: list, **kwargs):
+    def next_window(self, images_total: int, paths: list, offset: int, limit: int, iterate: bool):
+        if not iterate or limit <= 0:
+            return offset
+        # Restart from offset when the inputs change
+        cursor_key = (tuple(paths), offset, limit)
+        if self.cursor is None or self.cursor_key != cursor_key:
+            self.cursor = offset
+            self.cursor_key = cursor_key
+        if self.cursor >= images_total:
+            self.cursor = 0
+        window_offset = self.cursor
+        self.cursor += limit
+        return window_offset
+
+    @metrics.node("Load_Images_From_Paths")
+    def load_images(self, paths: list, load_captions: list, offset: list = [0], limit: list = [0], iterate: list = [False], 
+                    decode_threads: list = [4], cache: list = ["memory"], output_mode: list = ["list"], recursive: list = [False], 
+                    include: list = [""], exclude: list = [""], max_side: list = [0], **kwargs):
         load_captions = load_captions[0]
+        offset = offset[0]
+        limit = limit[0]
+        iterate = iterate[0]
+        decode_threads = decode_threads[0]
+        cache = cache[0]
+        output_mode = output_mode[0]
+        max_side = max_side[0]
         if len(paths) == 1:
             # Split it
             paths = split_paths(paths[0])
-        logger.debug(f"Load captions? {load_captions}, Paths = {paths}")
+        images_paths = iter_images_from_paths(paths, recursive[0], include[0], exclude[0])
+        with metrics.timer("load.list"):
+            if iterate and limit > 0:
+                # Wrapping around needs the total
+                images_paths = list(images_paths)
+                images_total = len(images_paths)
+                offset = self.next_window(images_total, paths, offset, limit, iterate)
+                images_paths = window_paths(images_paths, offset, limit)
+                next_offset = offset + limit if offset + limit < images_total else 0
+            else:
+                # Stops listing once the window is full
+                images_paths = list(islice(images_paths, offset, offset+limit if limit > 0 else None))
+                next_offset = offset + len(images_paths)
+        metrics.count("images", len(images_paths))
+        logger.debug(f"Load captions? {load_captions}, Paths = {paths}, Window = {offset}:{offset+len(images_paths)}")
+        if output_mode == "batch":
+            images, order = load_images_batches(images_paths, decode_threads, cache, max_side)
+            with metrics.timer("load.captions"):
+                captions = read_images_captions([images_paths[index] for index in order], decode_threads) if load_captions else []
+            return (images, captions, next_offset,)
         if load_captions:
             # Load .txt or .caption files matching with its image
-            images, captions = load_images_with_captions(paths)
-            return (images, captions,)
+            images, captions = load_images_with_captions(images_paths, decode_threads, cache, max_side)
+            return (images, captions, next_offset,)
         else:
-            return (load_images(paths), [],)
+            return (load_images(images_paths, decode_threads, cache, max_side), [], next_offset,)
 
 
 ################################ JSPaint Nodes
 
+# Decoded canvases by the SHA-256 of their PNG
+JSPAINT_CACHE_SIZE = 8
+jspaint_cache = OrderedDict()
+
+def decode_jspaint(png_bytes: bytes, save_temp: bool = False):
+    png_hash = hashlib.sha256(png_bytes).hexdigest()
+    if save_temp:
+        # Same canvas, same file, the PNG is written as received
+        filepath = os.path.join(get_comfy_dir('temp'), f"JSPAINT_{png_hash[:16]}.png")
+        if not os.path.exists(filepath):
+            logger.info(f"Saving {filepath}")
+            with open(filepath, "wb") as fp:
+                fp.write(png_bytes)
+    tensor = jspaint_cache.get(png_hash)
+    if tensor is None:
+        metrics.count("cache_misses")
+        with metrics.timer("jspaint.decode"), Image.open(BytesIO(png_bytes), formats=["PNG"]) as image_pil:
+            tensor = pil2tensor(image_pil)
+        jspaint_cache[png_hash] = tensor
+        while len(jspaint_cache) > JSPAINT_CACHE_SIZE:
+            jspaint_cache.popitem(last=False)
+    else:
+        metrics.count("cache_hits")
+    jspaint_cache.move_to_end(png_hash)
+    return tensor
+
+
 class D00MYsJSPaint:
     def __init__(self):
         self.type = "output"
@@ -638,6 +1073,9 @@ class D00MYsJSPaint:
             "required": {
                 "image": ("JSPAINT", {"default": None},),
             },
+            "optional": {
+                "save_temp": ("BOOLEAN", {"default": False, "forceInput": True, "tooltip": "Also write the painting in the ComfyUI temp folder."}),
+            },
             "hidden": {"unique_id": "UNIQUE_ID"},
         }
     
@@ -651,16 +1089,18 @@ class D00MYsJSPaint:
     FUNCTION = "save_png"
     CATEGORY = CATEGORY_STRING
 
-    def save_png(self, image: str, **kwargs):
+    @metrics.node("JSPaint")
+    def save_png(self, image: str, save_temp: bool = False, **kwargs):
         try:
-            # Save in temp folder
-            image_bs64 = image.split("data:image/png;base64,")[-1]
-            image_pil = Image.open(BytesIO(base64.b64decode(f"{image_bs64}==")), formats=["PNG"]).convert('RGB')
-            filepath = f"{get_comfy_dir('temp')}/JSPAINT_{uuid.uuid4()}.png"
-            logger.info(f"Saving {filepath}")
-            image_pil.save(filepath, "PNG")
-            image_pil.close()
-            return (load_image(filepath), )
+            if is_canvas_value(image):
+                # Uploaded canvas, the prompt only has its hash
+                with metrics.timer("jspaint.read_canvas"):
+                    png_bytes = get_canvas(canvas_value_hash(image))
+            else:
+                # Data URL of older workflows
+                image_bs64 = image.split("data:image/png;base64,")[-1]
+                png_bytes = base64.b64decode(f"{image_bs64}==")
+            return (decode_jspaint(png_bytes, save_temp), )
         except Exception as e:
             logger.error(f"Cannot decode PNG file: {e}")
             return (None, )
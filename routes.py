@@ -0,0 +1,30 @@
+from aiohttp import web
+from server import PromptServer
+
+from .logger import logger
+from .jspaint_store import put_canvas
+from .metrics import metrics
+
+routes = PromptServer.instance.routes
+
+
+@routes.post("/d00mys/jspaint/canvas")
+async def upload_jspaint_canvas(request):
+    # Raw PNG body, answers with the hash the JSPaint widget sends in the prompt
+    png_bytes = await request.read()
+    try:
+        png_hash = put_canvas(png_bytes)
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    except OSError as e:
+        logger.error(f"Cannot store JSPaint canvas: {e}")
+        return web.json_response({"error": str(e)}, status=500)
+    return web.json_response({"hash": png_hash})
+
+
+@routes.get("/d00mys/metrics")
+async def get_metrics(request):
+    # Per-node timings and counters, ?format=prometheus for the text exposition format
+    if request.query.get("format") == "prometheus":
+        return web.Response(text=metrics.prometheus(), content_type="text/plain", charset="utf-8")
+    return web.json_response(metrics.snapshot())
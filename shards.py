@@ -0,0 +1,179 @@
+import io
+import os
+import re
+import json
+import time
+import atexit
+import tarfile
+import threading
+
+from .logger import logger
+
+SHARD_EXT = ".tar"
+# Written next to every shard: member name, offset of its data in the tar and size
+SHARD_INDEX_EXT = ".idx.json"
+# Saved samples are referenced as {shard path}#{member name}
+MEMBER_SEPARATOR = "#"
+DEFAULT_SHARD_SIZE_MB = 512
+# Written when a shard is closed: two zero blocks, then zeros up to a whole record
+TAR_END_SIZE = 2 * tarfile.BLOCKSIZE + tarfile.RECORDSIZE
+
+
+def member_ref(shard_path: str, member_name: str):
+    return f"{shard_path}{MEMBER_SEPARATOR}{member_name}"
+
+def padded_size(size: int):
+    return (size + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE * tarfile.BLOCKSIZE
+
+"""
+Streams samples into rolling WebDataset style .tar shards ({prefix}-000000.tar, ...) in a directory.
+Every sample is a group of members sharing a key (000000_000001.png, 000000_000001.txt, ...),
+written in order and append-only. A shard is closed once it would grow past max_bytes,
+its index (member offsets and sizes) is written next to it as {shard}.idx.json
+"""
+class ShardWriter:
+    def __init__(self, directory: str, prefix: str, max_bytes: int):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.shard_path = None
+        self.__lock = threading.Lock()
+        self.__number = self.__scan()
+        self.__fp = None
+        self.__tar = None
+        self.__members = []
+        self.__samples = 0
+
+    def write(self, members: dict):
+        # members maps an extension (png, txt, json...) to its bytes, returns the paths of the members
+        # An integer mtime, a float one would need a PAX header for every member
+        mtime = int(time.time())
+        with self.__lock:
+            if self.__tar is None:
+                self.__open()
+            infos = self.__infos(members, mtime)
+            size = sum(self.__member_size(info) for info in infos)
+            if self.__tar.offset + size + TAR_END_SIZE > self.max_bytes and self.__members:
+                self.__close()
+                self.__open()
+                infos = self.__infos(members, mtime)
+            self.__samples += 1
+            paths = {}
+            for (ext, data), info in zip(members.items(), infos):
+                self.__tar.addfile(info, io.BytesIO(data))
+                # The data is padded to a block and ends at the current offset
+                offset_data = self.__tar.offset - padded_size(len(data))
+                self.__members.append([info.name, offset_data, len(data)])
+                paths[ext] = member_ref(self.shard_path, info.name)
+            return paths
+
+    def flush(self):
+        # Makes everything written so far readable, the shard stays open for the next samples
+        with self.__lock:
+            if self.__tar is not None:
+                self.__fp.flush()
+                write_shard_index(self.shard_path, self.__members)
+
+    def close(self):
+        with self.__lock:
+            if self.__tar is not None:
+                self.__close()
+
+    # Private API
+    def __infos(self, members: dict, mtime: int):
+        key = f"{self.__number:06}_{self.__samples:06}"
+        infos = []
+        for ext, data in members.items():
+            info = tarfile.TarInfo(f"{key}.{ext}")
+            info.size = len(data)
+            info.mtime = mtime
+            infos.append(info)
+        return infos
+
+    def __member_size(self, info: tarfile.TarInfo):
+        # Header blocks as the tar writes them, plus the padded data
+        header = info.tobuf(self.__tar.format, self.__tar.encoding, self.__tar.errors)
+        return len(header) + padded_size(info.size)
+
+    def __scan(self):
+        # Number of the next shard, a new run never appends to the shards of a previous one
+        pattern = re.compile(rf"{re.escape(self.prefix)}-(\d+){re.escape(SHARD_EXT)}")
+        highest = -1
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    match = pattern.fullmatch(entry.name)
+                    if match:
+                        highest = max(highest, int(match.group(1)))
+        except FileNotFoundError:
+            pass
+        return highest + 1
+
+    def __open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        while True:
+            self.shard_path = os.path.join(self.directory, f"{self.prefix}-{self.__number:06}{SHARD_EXT}")
+            try:
+                # Exclusive, another ComfyUI could write to the same directory
+                self.__fp = open(self.shard_path, "xb")
+                break
+            except FileExistsError:
+                self.__number += 1
+        self.__tar = tarfile.open(fileobj=self.__fp, mode="w", format=tarfile.PAX_FORMAT)
+        self.__members = []
+        self.__samples = 0
+        logger.info(f"Writing shard {self.shard_path}")
+
+    def __close(self):
+        self.__tar.close()
+        self.__fp.close()
+        write_shard_index(self.shard_path, self.__members)
+        self.__tar = None
+        self.__fp = None
+        self.__number += 1
+
+
+def write_shard_index(shard_path: str, members: list):
+    index_path = f"{shard_path}{SHARD_INDEX_EXT}"
+    temp_path = f"{index_path}.tmp"
+    with open(temp_path, "w", encoding="UTF-8") as fp:
+        json.dump({"shard": os.path.basename(shard_path), "members": members}, fp)
+    os.replace(temp_path, index_path)
+
+def read_shard_index(shard_path: str):
+    # {member name: (offset of the data, size)}, None when the shard has no index
+    index_path = f"{shard_path}{SHARD_INDEX_EXT}"
+    try:
+        with open(index_path, "r", encoding="UTF-8") as fp:
+            members = json.load(fp)["members"]
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Cannot read shard index {index_path}: {e}")
+        return None
+    return {name: (offset_data, size) for name, offset_data, size in members}
+
+
+# Writers stay open between executions so small batches fill the same shard
+shard_writers = dict()
+shard_writers_lock = threading.Lock()
+
+def get_shard_writer(directory: str, prefix: str, max_bytes: int):
+    key = (os.path.abspath(directory), prefix)
+    with shard_writers_lock:
+        writer = shard_writers.get(key)
+        if writer is None:
+            writer = ShardWriter(directory, prefix, max_bytes)
+            shard_writers[key] = writer
+        writer.max_bytes = max_bytes
+        return writer
+
+@atexit.register
+def close_shard_writers():
+    with shard_writers_lock:
+        for writer in shard_writers.values():
+            try:
+                writer.close()
+            except Exception as e:
+                logger.error(f"Cannot close shard {writer.shard_path}: {e}")
+        shard_writers.clear()
@@ -1,12 +1,19 @@
 import os
+import re
 import inspect
-import torch
-import numpy
-import pathlib
-from PIL import Image
+import fnmatch
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from server import PromptServer
 
+from .logger import logger
+from .lazy import lazy_import
+
+torch = lazy_import("torch")
+numpy = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+
 IMAGES_TYPES = [".jpg", ".jpeg", ".png", ".webp"]
 
 # https://github.com/pythongosssss/ComfyUI-Custom-Scripts/blob/main/pysssss.py
@@ -40,32 +47,156 @@ def validate_load_images(directory: str):
         return f"No files in directory '{directory}'."
     return True
 
-def list_images_paths(directory: str):
-    try:
-        files_paths = [os.path.join(directory, file) for file in os.listdir(directory)]
-        images_paths = list(filter(lambda file_path: os.path.isfile(file_path) and pathlib.Path(file_path).suffix in IMAGES_TYPES, files_paths))
-        return images_paths
-    except Exception as e:
-        return []
-    
-# Stolen from : https://github.com/GeekyGhost/ComfyUI-GeekyRemB/blob/SketchUITest/scripts/GeekyRembv2.py
-def pil2tensor(image: Image):
-    np_image = numpy.array(image).astype(numpy.float32) / 255.0
-    if np_image.ndim == 2:  # If it's a grayscale image (mask)
-        np_image = numpy.array(image.convert("RGB")).astype(numpy.float32) / 255.0
-        np_image = np_image[None, ...]
-        return torch.from_numpy(np_image)
-    elif np_image.ndim == 3:  # If it's an RGB image
-        np_image = np_image[None, ...]  # Add batch dimension
-        return torch.from_numpy(np_image)
+def is_image_path(path: str):
+    return os.path.splitext(path)[1].lower() in IMAGES_TYPES
+
+def split_patterns(patterns: str):
+    # Comma or newline separated glob patterns
+    return [pattern.strip().lower() for pattern in re.split(r"[,\n]", patterns or "") if pattern.strip()]
+
+def match_patterns(relative_path: str, patterns: list):
+    # Patterns match the path relative to the listed directory or only the file name
+    relative_path = relative_path.lower()
+    name = relative_path.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatchcase(relative_path, pattern) or fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+def iter_images_paths(directory: str, recursive: bool = False, include: str = "", exclude: str = "", skip_directories: list = []):
+    # Yields the images of directory sorted by name, then the ones of its subdirectories,
+    # one directory listing at a time (os.scandir entries already know if they are files).
+    # The subdirectories in skip_directories are not walked
+    include = split_patterns(include)
+    exclude = split_patterns(exclude)
+    skip_directories = {os.path.abspath(path) for path in skip_directories}
+    directories = deque([(directory, "")])
+    while directories:
+        current, relative = directories.popleft()
+        try:
+            with os.scandir(current) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.error(f"Cannot list images in {current}: {e}")
+            continue
+        subdirectories = list()
+        for entry in entries:
+            relative_path = f"{relative}{entry.name}"
+            if entry.is_file():
+                if not is_image_path(entry.name):
+                    continue
+                if include and not match_patterns(relative_path, include):
+                    continue
+                if exclude and match_patterns(relative_path, exclude):
+                    continue
+                yield entry.path
+            elif recursive and entry.is_dir(follow_symlinks=False):
+                if skip_directories and os.path.abspath(entry.path) in skip_directories:
+                    continue
+                subdirectories.append((entry.path, f"{relative_path}/"))
+        # Depth first so a subdirectory is done before its next sibling
+        directories.extendleft(reversed(subdirectories))
+
+def imap_ordered(func, items, workers: int = 1, read_ahead: int = 0):
+    # Like map() but runs func on a thread pool, keeping at most read_ahead calls in flight
+    if workers <= 1:
+        yield from map(func, items)
+        return
+    read_ahead = max(read_ahead, workers) if read_ahead > 0 else workers * 2
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= read_ahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# Elements scaled at a time by tensor2numpy, bounds its float scratch buffer to 1 MB
+TENSOR2NUMPY_CHUNK = 256 * 1024
+# Downscaling first reduces by an integer factor down to reducing_gap times the target size, then resamples
+REDUCING_GAP = 2.0
+
+def reduced_size(size: tuple, max_side: int = 0):
+    # (width, height) fitting in max_side with the same ratio, never upscaled, 0 keeps the size
+    width, height = size
+    if max_side <= 0 or max(width, height) <= max_side:
+        return size
+    scale = max_side / max(width, height)
+    return (max(1, round(width * scale)), max(1, round(height * scale)))
+
+def reduce_image(image: Image, max_side: int = 0):
+    # Must be called before the pixels are loaded. JPEGs are decoded directly at 1/2, 1/4 or 1/8
+    # scale by draft(), other formats are reduced by an integer factor before the final resample
+    size = reduced_size(image.size, max_side)
+    if size == image.size:
+        return image
+    if image.format == "JPEG":
+        image.draft(image.mode, (int(size[0] * REDUCING_GAP), int(size[1] * REDUCING_GAP)))
+    if image.mode in ("1", "P", "PA"):
+        # Resampled in RGB, palettes would only allow nearest neighbour
+        image = image.convert("RGB")
+    elif image.mode.startswith("I;16"):
+        # LANCZOS does not take 16-bit modes, pil2numpy scales "I" by 65535 as well
+        image = image.convert("I")
+    return image.resize(size, Image.LANCZOS, reducing_gap=REDUCING_GAP)
+
+def pil2numpy(image: Image):
+    # Returns a view of the image pixels (HxW or HxWxC) and the value of white
+    mode = image.mode
+    if mode in ("RGB", "L"):
+        return numpy.asarray(image), 255
+    if mode in ("RGBA", "RGBX"):
+        # Alpha is dropped, the view skips it without copying
+        return numpy.asarray(image)[..., :3], 255
+    if mode == "LA":
+        return numpy.asarray(image)[..., 0], 255
+    if mode.startswith("I;16"):
+        return numpy.asarray(image), 65535
+    if mode == "I":
+        # 16-bit PNGs are opened as 32-bit integers
+        return numpy.asarray(image), 65535
+    # Palette, bilevel, CMYK, YCbCr, float...
+    return numpy.asarray(image.convert("RGB")), 255
+
+def pil2tensor(image: Image, out=None):
+    # Scales straight into the float32 [1,H,W,3] output (or the given slice of a batch),
+    # grayscale is broadcast to the 3 channels instead of being converted first
+    array, white = pil2numpy(image)
+    height, width = array.shape[0], array.shape[1]
+    if out is None:
+        out = torch.empty((1, height, width, 3), dtype=torch.float32)
+    target = out.numpy().reshape(height, width, 3)
+    if array.ndim == 2:
+        array = array[..., None]
+    numpy.divide(array, white, out=target, dtype=numpy.float32, casting="unsafe")
+    if image.mode == "I":
+        numpy.clip(target, 0.0, 1.0, out=target)
+    return out
 
 def tensor2pil(tensor):
-    tensor = tensor2numpy(tensor)
-    if numpy.ndim(tensor)>3:
-        assert tensor.shape[0] == 1
-        tensor = tensor[0]
-    return Image.fromarray(tensor)
+    array = tensor2numpy(tensor)
+    if array.ndim > 3:
+        assert array.shape[0] == 1
+        array = array[0]
+    return numpy2pil(array)
+
+def numpy2pil(array):
+    if array.ndim == 3 and array.shape[-1] == 1:
+        array = array[..., 0]
+    return Image.fromarray(array)
 
 def tensor2numpy(tensor):
-    tensor = tensor*255
-    return numpy.array(tensor, dtype=numpy.uint8)
\ No newline at end of file
+    # Clamps and rounds to uint8, the only full size allocation is the result
+    if torch.is_tensor(tensor):
+        tensor = tensor.detach().to(device="cpu", dtype=torch.float32).numpy()
+    array = numpy.ascontiguousarray(tensor, dtype=numpy.float32)
+    result = numpy.empty(array.shape, dtype=numpy.uint8)
+    array = array.reshape(-1)
+    result_flat = result.reshape(-1)
+    scratch = numpy.empty(min(array.size, TENSOR2NUMPY_CHUNK), dtype=numpy.float32)
+    for start in range(0, array.size, TENSOR2NUMPY_CHUNK):
+        chunk = array[start:start+TENSOR2NUMPY_CHUNK]
+        buffer = scratch[:chunk.size]
+        numpy.multiply(chunk, 255.0, out=buffer)
+        numpy.clip(buffer, 0.0, 255.0, out=buffer)
+        numpy.rint(buffer, out=buffer)
+        result_flat[start:start+chunk.size] = buffer
+    return result
@@ -1,4 +1,5 @@
 import { app } from "../../../scripts/app.js";
+import { api } from "../../../scripts/api.js";
 import { $el } from "../../../scripts/ui.js";
 
 // JSPAINT Instances
@@ -32,6 +33,21 @@ function get_position_style(ctx, widget_width, y, node_height) {
     }
 }
 
+// Sends the canvas PNG as binary, the prompt then only carries its hash
+async function uploadCanvas(dataURL) {
+    const blob = await (await fetch(dataURL)).blob();
+    const response = await api.fetchApi("/d00mys/jspaint/canvas", {
+        method: "POST",
+        headers: { "Content-Type": "image/png" },
+        body: blob,
+    });
+    if (response.status !== 200) {
+        throw new Error(`${response.status} ${response.statusText}`);
+    }
+    const { hash } = await response.json();
+    return `jspaint:sha256:${hash}`;
+}
+
 function JSPAINT() {
     // Create widget
     const uid  = uuid();
@@ -63,7 +79,21 @@ function JSPAINT() {
             const jspaint = iframe.contentWindow;
             const hash = jspaint.location.hash.split(":")[jspaint.location.hash.split(":").length - 1];
             const imageKey = `image#${hash}`
-            return jspaint.localStorage.getItem(imageKey);
+            const dataURL = jspaint.localStorage.getItem(imageKey);
+            if (!dataURL) {
+                return dataURL;
+            }
+            // Only upload again when the painting changed
+            if (widget.uploadedDataURL !== dataURL) {
+                try {
+                    widget.uploadedValue = await uploadCanvas(dataURL);
+                    widget.uploadedDataURL = dataURL;
+                } catch (error) {
+                    console.error("D00MYs.JSPaint: cannot upload the canvas, sending it in the prompt", error);
+                    return dataURL;
+                }
+            }
+            return widget.uploadedValue;
         }
     };
     return widget;